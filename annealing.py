@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created: 19.10.2026
+
+This file is dedicated to the simulated annealing solver.
+Instead of exploring a search tree, the solver starts from a greedy
+nearest assignment, then repeatedly replaces a selected element of a group
+by a non-selected one, accepting worse solutions with a probability
+that decreases with a temperature.
+Moves are evaluated from running group statistics
+(see EquiTables.objectives), so that their cost does not depend
+on the size of the groups nor of the subgroups.
+Temperature schedules are functions that take an initial temperature,
+a final one and the progress of the search (from 0 to 1),
+and return the current temperature.
+Defined schedules should be added to the ALLOWED_TEMPERATURE_SCHEDULE_NAMES dictionnary with their name.
+"""
+import time
+import numpy as np
+import metrics
+import objectives
+
+STATISTICS_REFRESH_PERIOD = 10000
+NUM_TEMPERATURE_SAMPLES = 100
+
+
+def geometric_schedule(initial_temperature, final_temperature, progress):
+    return initial_temperature * (final_temperature / initial_temperature)**progress
+
+def linear_schedule(initial_temperature, final_temperature, progress):
+    return initial_temperature + (final_temperature - initial_temperature) * progress
+
+ALLOWED_TEMPERATURE_SCHEDULE_NAMES = {
+    'geometric': geometric_schedule,
+    'linear': linear_schedule
+}
+
+def get_temperature_schedule_by_name(schedule_name):
+    """
+    This function retrieves a given temperature schedule by its name.
+    If the name is not valid, returns "geometric" schedule,
+    and raises a warning.
+    --
+    Input:
+        - schedule_name: string. The name of the schedule.
+            Current possible options are:
+                + geometric
+                + linear
+    Outputs:
+        - temperature_schedule: temperature schedule. The chosen schedule.
+            Is "geometric" schedule by default for invalid names.
+    """
+    if schedule_name in ALLOWED_TEMPERATURE_SCHEDULE_NAMES:
+        return ALLOWED_TEMPERATURE_SCHEDULE_NAMES[schedule_name]
+    default_schedule_name = list(ALLOWED_TEMPERATURE_SCHEDULE_NAMES.keys())[0]
+    print(  f"WARNING: invalid name - {schedule_name}!\n"+
+            f"Resolving to default schedule '{default_schedule_name}'.")
+    return ALLOWED_TEMPERATURE_SCHEDULE_NAMES[default_schedule_name]
+
+
+def build_greedy_selection(values_by_group, subgroups_size):
+    """
+    Builds a greedy assignment, filling tuples one after the other,
+    each slot with the candidate nearest to the elements already in its tuple
+    (as the "simple_nearest" local heuristic does).
+    --
+    Input:
+        - values_by_group: float array list. The (transformed) values
+            of the candidates of each group, one per row.
+        - subgroups_size: int. The size of the subgroups.
+    Output:
+        - selected_positions: int array list. For each group,
+            the positions of the selected candidates.
+    """
+    available_by_group = [np.ones(len(values), dtype=bool) for values in values_by_group]
+    selected_positions = [[] for _ in values_by_group]
+    for _ in range(subgroups_size):
+        tuple_values = []
+        for group_position, values in enumerate(values_by_group):
+            candidate_positions = np.flatnonzero(available_by_group[group_position])
+            distances = metrics.compute_squared_distances_to_tuple(
+                values[candidate_positions],
+                np.asarray(tuple_values).reshape(len(tuple_values), values.shape[1])
+            )
+            chosen_position = candidate_positions[np.argmin(distances)]
+            available_by_group[group_position][chosen_position] = False
+            selected_positions[group_position].append(chosen_position)
+            tuple_values.append(values[chosen_position])
+    return [np.asarray(positions, dtype=int) for positions in selected_positions]
+
+def complete_selection(values_by_group, subgroups_size, objective, selected_positions):
+    """
+    Completes a partial assignment up to the size of the subgroups,
+    adding to each group in turn the candidate
+    that increases the distance the least.
+    --
+    Input:
+        - values_by_group: float array list. The (transformed) values
+            of the candidates of each group, one per row.
+        - subgroups_size: int. The size of the subgroups.
+        - objective: objective. The objective to minimize.
+        - selected_positions: int array list. For each group,
+            the positions of the already selected candidates.
+    Output:
+        - selected_positions: int array list. For each group,
+            the positions of the selected candidates.
+    """
+    selected_positions = [list(positions) for positions in selected_positions]
+    statistics = compute_statistics(values_by_group, selected_positions)
+    available_by_group = []
+    for values, positions in zip(values_by_group, selected_positions):
+        available = np.ones(len(values), dtype=bool)
+        available[positions] = False
+        available_by_group.append(available)
+    while any(len(positions) < subgroups_size for positions in selected_positions):
+        for group_position, values in enumerate(values_by_group):
+            if len(selected_positions[group_position]) >= subgroups_size:
+                continue
+            candidate_positions = np.flatnonzero(available_by_group[group_position])
+            distances = objective.compute_distances_if_added(
+                statistics, group_position, values[candidate_positions])
+            chosen_position = candidate_positions[np.argmin(distances)]
+            available_by_group[group_position][chosen_position] = False
+            selected_positions[group_position].append(chosen_position)
+            statistics.add(group_position, values[chosen_position])
+    return [np.asarray(positions, dtype=int) for positions in selected_positions]
+
+def compute_statistics(values_by_group, selected_positions):
+    """
+    Computes the group statistics of a selection from scratch.
+    """
+    statistics = objectives.GroupStatistics(len(values_by_group),
+                                            values_by_group[0].shape[1])
+    for group_position, (values, positions) in enumerate(zip(values_by_group,
+                                                            selected_positions)):
+        for row in values[positions]:
+            statistics.add(group_position, row)
+    return statistics
+
+def anneal_selection(values_by_group,
+                     subgroups_size,
+                     objective,
+                     max_iterations = 100000,
+                     time_limit = None,
+                     seed = None,
+                     temperature_schedule_name = "geometric",
+                     initial_temperature = None,
+                     final_temperature_ratio = 1e-3,
+                     stop_event = None,
+                     initial_positions = None):
+    """
+    Selects a subgroup of candidates in each group by simulated annealing.
+    --
+    Input:
+        - values_by_group: float array list. The (transformed) values
+            of the candidates of each group, one per row.
+        - subgroups_size: int. The size of the subgroups.
+        - objective: objective. The objective to minimize.
+    Parameters:
+        - max_iterations: int. The number of moves to try.
+            Defaults to 100000.
+        - time_limit: float. The maximal search time, in seconds.
+            Defaults to None (no limit).
+        - seed: int. The seed of the random generator.
+            Defaults to None (unseeded).
+        - temperature_schedule_name: string. The name of the schedule.
+            Defaults to "geometric".
+        - initial_temperature: float. The initial temperature.
+            Defaults to None (the mean worsening of random moves
+            from the initial assignment).
+        - final_temperature_ratio: float. The ratio of the final temperature
+            to the initial one. Defaults to 1e-3.
+        - stop_event: threading.Event. An event to stop the search early.
+            Defaults to None.
+        - initial_positions: int array list. For each group, the positions
+            of the candidates to start from.
+            Defaults to None (greedy nearest assignment).
+    Output:
+        - distance: float. The distance of the best selection found.
+        - selected_positions: int array list. For each group,
+            the positions of the selected candidates, in tuple order.
+    """
+    start_time = time.monotonic()
+    random_generator = np.random.default_rng(seed)
+    temperature_schedule = get_temperature_schedule_by_name(temperature_schedule_name)
+    if any(len(values) < subgroups_size for values in values_by_group):
+        raise ValueError(f"Every group needs at least {subgroups_size} elements!")
+
+    # Positions of the candidates in each group: selected ones first.
+    if initial_positions is None:
+        initial_positions = build_greedy_selection(values_by_group, subgroups_size)
+    positions_by_group = []
+    for values, positions in zip(values_by_group, initial_positions):
+        others = np.setdiff1d(np.arange(len(values)), positions)
+        positions_by_group.append(np.concatenate([positions, others]).astype(int))
+    movable_groups = [group_position for group_position, values in enumerate(values_by_group)
+                      if len(values) > subgroups_size]
+
+    def draw_move():
+        group_position = movable_groups[random_generator.integers(len(movable_groups))]
+        selected = random_generator.integers(subgroups_size)
+        replacement = random_generator.integers(subgroups_size,
+                                                len(values_by_group[group_position]))
+        return group_position, selected, replacement
+
+    def get_move_values(move):
+        group_position, selected, replacement = move
+        values = values_by_group[group_position]
+        positions = positions_by_group[group_position]
+        return values[positions[selected]], values[positions[replacement]]
+
+    def get_selection():
+        return [positions[:subgroups_size] for positions in positions_by_group]
+
+    statistics = compute_statistics(values_by_group, get_selection())
+    distance = objective.compute_distance(statistics)
+    best_distance, best_selection = distance, [p.copy() for p in get_selection()]
+
+    if movable_groups:
+        if initial_temperature is None:
+            worsenings = []
+            for _ in range(NUM_TEMPERATURE_SAMPLES):
+                move = draw_move()
+                removed_values, added_values = get_move_values(move)
+                statistics.remove(move[0], removed_values)
+                statistics.add(move[0], added_values)
+                worsenings.append(objective.compute_distance(statistics) - distance)
+                statistics.remove(move[0], added_values)
+                statistics.add(move[0], removed_values)
+            positive_worsenings = [w for w in worsenings if w > 0]
+            initial_temperature = (np.mean(positive_worsenings)
+                                   if positive_worsenings else 1.)
+        final_temperature = initial_temperature * final_temperature_ratio
+
+        for num_iterations in range(max_iterations):
+            progress = num_iterations / max_iterations
+            if time_limit is not None:
+                progress = (1. if time_limit <= 0 else
+                            max(progress, (time.monotonic() - start_time) / time_limit))
+                if progress >= 1:
+                    break
+            if stop_event is not None and stop_event.is_set():
+                break
+            if num_iterations % STATISTICS_REFRESH_PERIOD == 0:
+                statistics = compute_statistics(values_by_group, get_selection())
+                distance = objective.compute_distance(statistics)
+
+            move = draw_move()
+            removed_values, added_values = get_move_values(move)
+            statistics.remove(move[0], removed_values)
+            statistics.add(move[0], added_values)
+            new_distance = objective.compute_distance(statistics)
+            temperature = temperature_schedule(initial_temperature,
+                                               final_temperature, progress)
+            worsening = new_distance - distance
+            if worsening <= 0 or random_generator.random() < np.exp(-worsening / temperature):
+                group_position, selected, replacement = move
+                positions = positions_by_group[group_position]
+                positions[selected], positions[replacement] = (positions[replacement],
+                                                               positions[selected])
+                distance = new_distance
+                if distance < best_distance:
+                    best_distance = distance
+                    best_selection = [p.copy() for p in get_selection()]
+            else:
+                statistics.remove(move[0], added_values)
+                statistics.add(move[0], removed_values)
+
+    best_distance = objective.compute_distance(
+        compute_statistics(values_by_group, best_selection))
+    return best_distance, best_selection
+
+def get_root_candidates(search_tree):
+    """
+    Returns the candidate rows of each group of a search tree,
+    and their (transformed) values.
+    --
+    Input:
+        - search_tree: SearchTree. The search tree to solve for.
+    Output:
+        - rows_by_group: int array list. The candidate rows of each group,
+            in the order of the groups of the feature matrix.
+        - values_by_group: float array list. The values of these candidates.
+    """
+    feature_matrix = search_tree.root.feature_matrix
+    rows_by_group = feature_matrix.group_rows
+    values_by_group = [feature_matrix.values[rows] for rows in rows_by_group]
+    return rows_by_group, values_by_group
+
+def record_selection(search_tree, distance, rows_by_group, selected_positions):
+    """
+    Records a selection as the current solution of a search tree.
+    --
+    Input:
+        - search_tree: SearchTree. The search tree solved for.
+        - distance: float. The distance of the selection.
+        - rows_by_group: int array list. The candidate rows of each group.
+        - selected_positions: int array list. For each group,
+            the positions of the selected candidates, in tuple order.
+    Output:
+        - solution: int array. The selection, as the row chosen
+            for each tuple (line) and group (column).
+    """
+    solution = np.stack([rows[positions] for rows, positions
+                         in zip(rows_by_group, selected_positions)], axis=1)
+    search_tree.record_solution(distance, solution)
+    search_tree.root.internal_distance = distance
+    search_tree.root.solution = solution
+    return solution
+
+def anneal(search_tree, **annealing_parameters):
+    """
+    Computes a solution by simulated annealing, for the groups, subgroups size,
+    feature matrix and objective of a search tree.
+    The best solution found becomes the current solution of the tree
+    (see SearchTree.get_current_solution).
+    --
+    Input:
+        - search_tree: SearchTree. The search tree to solve for.
+    Parameters:
+        - annealing_parameters: the parameters of anneal_selection.
+    Output:
+        - distance: float. The distance of the best solution found.
+        - solution: int array. The best solution found, as the row chosen
+            for each tuple (line) and group (column).
+    """
+    rows_by_group, values_by_group = get_root_candidates(search_tree)
+    distance, selected_positions = anneal_selection(
+        values_by_group,
+        search_tree.root.subgroups_size,
+        search_tree.root.objective,
+        **annealing_parameters)
+    solution = record_selection(search_tree, distance,
+                                rows_by_group, selected_positions)
+    return distance, solution
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created: 19.10.2026
+
+This file is dedicated to binary caches of data files.
+A data file is parsed once and stored as one .npy array per column,
+along with a small metadata file holding the column names, dtypes,
+label tables of text columns, and a hash of the source file.
+Later loads memory-map the arrays instead of parsing the file again.
+The cache is rebuilt whenever the source file changes.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+
+CACHE_FORMAT_VERSION = 1
+CACHE_DIRECTORY_SUFFIX = ".equitables-cache"
+METADATA_FILENAME = "metadata.json"
+
+
+def get_cache_directory(datafile_path, cache_directory = None):
+    """
+    Returns the directory of the binary cache of a data file.
+    --
+    Input:
+        - datafile_path: string. The path of the data file.
+    Parameters:
+        - cache_directory: string. A directory to hold the caches.
+            Defaults to None (the cache is stored next to the data file).
+    Output:
+        - directory: string. The directory of the cache.
+    """
+    if cache_directory is None:
+        return datafile_path + CACHE_DIRECTORY_SUFFIX
+    return os.path.join(cache_directory,
+                        os.path.basename(datafile_path) + CACHE_DIRECTORY_SUFFIX)
+
+def compute_file_hash(file_path, chunk_size = 1 << 20):
+    """
+    Computes the SHA-256 hash of a file.
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as hashed_file:
+        for chunk in iter(lambda: hashed_file.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+def read_metadata(directory):
+    """
+    Reads the metadata of a cache, or returns None if there is none.
+    """
+    metadata_path = os.path.join(directory, METADATA_FILENAME)
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path) as metadata_file:
+        return json.load(metadata_file)
+
+def write_metadata(metadata, directory):
+    """
+    Writes the metadata of a cache.
+    It is written last, to a temporary file of its own replacing it at once,
+    so that a cache is only valid once all its arrays are written,
+    even when several processes write the same cache.
+    """
+    metadata_path = os.path.join(directory, METADATA_FILENAME)
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp",
+                                     delete=False) as metadata_file:
+        try:
+            json.dump(metadata, metadata_file)
+        except BaseException:
+            metadata_file.close()
+            os.remove(metadata_file.name)
+            raise
+    os.replace(metadata_file.name, metadata_path)
+
+def is_cache_valid(metadata, datafile_path, delimiter, directory):
+    """
+    Checks if a cache matches the current content of its data file.
+    The file size and modification time are checked first;
+    if they changed, the content hash is compared,
+    and the metadata updated if the content did not change.
+    """
+    if (metadata is None or metadata["version"] != CACHE_FORMAT_VERSION
+            or metadata["delimiter"] != delimiter):
+        return False
+    file_status = os.stat(datafile_path)
+    if (metadata["source_size"] == file_status.st_size
+            and metadata["source_mtime_ns"] == file_status.st_mtime_ns):
+        return True
+    if metadata["source_hash"] != compute_file_hash(datafile_path):
+        return False
+    metadata["source_size"] = file_status.st_size
+    metadata["source_mtime_ns"] = file_status.st_mtime_ns
+    write_metadata(metadata, directory)
+    return True
+
+def write_array(values, directory, array_filename):
+    """
+    Writes an array of a cache.
+    It is written to a temporary file of its own replacing it at once,
+    so that readers that memory-mapped the previous array keep it whole,
+    even when several processes write the same cache.
+    """
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp",
+                                     delete=False) as array_file:
+        try:
+            np.save(array_file, values)
+        except BaseException:
+            array_file.close()
+            os.remove(array_file.name)
+            raise
+    os.replace(array_file.name, os.path.join(directory, array_filename))
+
+def build_cache(datafile_path, delimiter = ";", cache_directory = None):
+    """
+    Parses a data file and writes its binary cache.
+    Text columns are stored as integer codes into a label table.
+    --
+    Input:
+        - datafile_path: string. The path of the .csv data file.
+    Parameters:
+        - delimiter: string. The delimiter of the data file. Defaults to ';'.
+        - cache_directory: string. A directory to hold the caches.
+            Defaults to None (next to the data file).
+    Output:
+        - metadata: dict. The metadata of the written cache.
+    """
+    directory = get_cache_directory(datafile_path, cache_directory)
+    os.makedirs(directory, exist_ok=True)
+    source_hash = compute_file_hash(datafile_path)
+    file_status = os.stat(datafile_path)
+    dataframe = pd.read_csv(datafile_path, sep=delimiter)
+
+    columns = []
+    for column_index, column_name in enumerate(dataframe.columns):
+        values = dataframe[column_name].to_numpy()
+        labels = None
+        if values.dtype == object:
+            codes, label_index = pd.factorize(values)
+            values = codes.astype(np.int32)
+            labels = [str(label) for label in label_index]
+        array_filename = f"column_{column_index:04d}.npy"
+        write_array(values, directory, array_filename)
+        columns.append({"name": str(column_name),
+                        "file": array_filename,
+                        "dtype": values.dtype.str,
+                        "labels": labels})
+
+    metadata = {"version": CACHE_FORMAT_VERSION,
+                "delimiter": delimiter,
+                "source_hash": source_hash,
+                "source_size": file_status.st_size,
+                "source_mtime_ns": file_status.st_mtime_ns,
+                "num_rows": len(dataframe),
+                "columns": columns}
+    write_metadata(metadata, directory)
+    return metadata
+
+def get_valid_metadata(datafile_path, delimiter = ";", cache_directory = None):
+    """
+    Returns the metadata of a valid cache of a data file,
+    building (or rebuilding) the cache if needed.
+    """
+    directory = get_cache_directory(datafile_path, cache_directory)
+    metadata = read_metadata(directory)
+    if not is_cache_valid(metadata, datafile_path, delimiter, directory):
+        metadata = build_cache(datafile_path, delimiter, cache_directory)
+    return metadata
+
+def load_columns(datafile_path, delimiter = ";", cache_directory = None,
+                 column_names = None):
+    """
+    Memory-maps the columns of a data file from its binary cache,
+    building the cache first if needed.
+    --
+    Input:
+        - datafile_path: string. The path of the .csv data file.
+    Parameters:
+        - delimiter: string. The delimiter of the data file. Defaults to ';'.
+        - cache_directory: string. A directory to hold the caches.
+            Defaults to None (next to the data file).
+        - column_names: string list. The columns to load.
+            Defaults to None (all columns).
+    Output:
+        - arrays: array dict. The (memory-mapped) array of each column.
+            Text columns are arrays of codes into their label table.
+        - labels: string list dict. The label table of each text column.
+    """
+    directory = get_cache_directory(datafile_path, cache_directory)
+    metadata = get_valid_metadata(datafile_path, delimiter, cache_directory)
+    columns_by_name = {column["name"]: column for column in metadata["columns"]}
+    if column_names is None:
+        column_names = list(columns_by_name.keys())
+
+    arrays = {}
+    labels = {}
+    for column_name in column_names:
+        if column_name not in columns_by_name:
+            raise KeyError(f"Unknown column: {column_name}!")
+        column = columns_by_name[column_name]
+        arrays[column_name] = np.load(os.path.join(directory, column["file"]),
+                                      mmap_mode="r")
+        if column["labels"] is not None:
+            labels[column_name] = column["labels"]
+    return arrays, labels
+
+def load_dataframe(datafile_path, delimiter = ";", cache_directory = None,
+                   column_names = None):
+    """
+    Loads a data file as a dataframe from its binary cache,
+    building the cache first if needed.
+    Text columns are loaded as categorical columns.
+    --
+    Input:
+        - datafile_path: string. The path of the .csv data file.
+    Parameters:
+        - delimiter: string. The delimiter of the data file. Defaults to ';'.
+        - cache_directory: string. A directory to hold the caches.
+            Defaults to None (next to the data file).
+        - column_names: string list. The columns to load.
+            Defaults to None (all columns).
+    Output:
+        - dataframe: pd.DataFrame. The loaded dataframe.
+    """
+    arrays, labels = load_columns(datafile_path, delimiter, cache_directory,
+                                  column_names)
+    columns = {}
+    for column_name, values in arrays.items():
+        if column_name in labels:
+            columns[column_name] = pd.Categorical.from_codes(
+                values, categories=labels[column_name])
+        else:
+            columns[column_name] = values
+    return pd.DataFrame(columns)
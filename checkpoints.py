@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created: 19.10.2026
+
+This file is dedicated to saving and loading search checkpoints.
+A checkpoint only stores the current path of the search
+(the decision taken at each level, the decisions already explored from it,
+and the best distance and solution found below it),
+as well as a few counters, so that it stays small and cheap to write.
+"""
+import os
+import pickle
+
+CHECKPOINT_VERSION = 4
+
+
+def save_checkpoint(checkpoint_state, checkpoint_path):
+    """
+    Writes a checkpoint state to a file.
+    The file is first written aside then moved in place,
+    so that an interrupted write never corrupts a previous checkpoint.
+    --
+    Input:
+        - checkpoint_state: dict. The state to save,
+            as returned by SearchTree.get_checkpoint_state.
+        - checkpoint_path: string. The path of the checkpoint file.
+    """
+    temporary_path = checkpoint_path + ".tmp"
+    with open(temporary_path, "wb") as checkpoint_file:
+        pickle.dump(
+            (CHECKPOINT_VERSION, checkpoint_state),
+            checkpoint_file,
+            protocol=pickle.HIGHEST_PROTOCOL
+        )
+    os.replace(temporary_path, checkpoint_path)
+
+
+def load_checkpoint(checkpoint_path):
+    """
+    Reads a checkpoint state from a file.
+    Raises a ValueError if the file was written by an incompatible version.
+    --
+    Input:
+        - checkpoint_path: string. The path of the checkpoint file.
+    Output:
+        - checkpoint_state: dict. The saved state,
+            to be given to SearchTree.restore_checkpoint_state.
+    """
+    with open(checkpoint_path, "rb") as checkpoint_file:
+        version, checkpoint_state = pickle.load(checkpoint_file)
+    if version != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version: {version}! "
+                         f"Expected {CHECKPOINT_VERSION}.")
+    return checkpoint_state
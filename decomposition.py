@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created: 19.10.2026
+
+This file is dedicated to the stratified decomposition of large matching problems.
+Candidates of all groups are binned into quantile strata
+along the first principal component of their (transformed) values.
+The subgroups size is split over the strata, and each stratum is matched
+on its own by simulated annealing (see EquiTables.annealing),
+in parallel worker processes (see get_process_context).
+The partial solutions are then merged, completed if some strata
+could not hold their share, and refined by annealing over the full groups.
+As each subproblem only holds a fraction of the candidates and of the slots,
+the cost grows about linearly with the size of the groups.
+"""
+import sys
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+import annealing
+
+# Time between two checks of the stop event while strata are solved, in seconds.
+STOP_POLL_INTERVAL = 0.1
+
+# Modules loaded once by the fork server, rather than by every worker process.
+FORKSERVER_PRELOAD = ["numpy", "annealing", "decomposition"]
+
+# Stop event of the strata solved by a worker process (see set_worker_stop_event).
+worker_stop_event = None
+
+
+def get_process_context():
+    """
+    Returns the multiprocessing context of the worker processes.
+    While the process runs a single thread, workers are forked:
+    this is cheap and works from any script, even without a main guard.
+    Otherwise (e.g. in the matching server), forking could copy locks
+    held by other threads, so workers are started from a fork server
+    preloaded with the solver, or spawned where there is none.
+    Both then import the main module of the program, whose entry point
+    must thus be guarded by "if __name__ == '__main__':".
+    """
+    start_methods = multiprocessing.get_all_start_methods()
+    if (threading.active_count() == 1 and "fork" in start_methods
+            and sys.platform != "darwin"):
+        return multiprocessing.get_context("fork")
+    if "forkserver" in start_methods:
+        process_context = multiprocessing.get_context("forkserver")
+        process_context.set_forkserver_preload(FORKSERVER_PRELOAD)
+        return process_context
+    return multiprocessing.get_context("spawn")
+
+def set_worker_stop_event(stop_event):
+    """
+    Initializes a worker process with the event stopping its strata.
+    """
+    global worker_stop_event
+    worker_stop_event = stop_event
+
+
+def compute_strata(values, num_strata):
+    """
+    Bins elements into quantile strata along the first principal component
+    of their values.
+    --
+    Input:
+        - values: float array. The values of the elements, one per row.
+        - num_strata: int. The number of strata.
+    Output:
+        - strata: int array. The stratum of each element.
+    """
+    centered_values = values - np.mean(values, axis=0)
+    _, eigenvectors = np.linalg.eigh(centered_values.T @ centered_values)
+    projections = centered_values @ eigenvectors[:, -1]
+    edges = np.quantile(projections, np.linspace(0, 1, num_strata + 1)[1:-1])
+    return np.searchsorted(edges, projections, side="right")
+
+def allocate_slots(capacities, subgroups_size):
+    """
+    Splits the subgroups size over strata, in proportion to their capacities
+    (by largest remainders), without exceeding any capacity.
+    --
+    Input:
+        - capacities: int array. The largest number of slots of each stratum,
+            that is its smallest number of candidates over the groups.
+        - subgroups_size: int. The size of the subgroups.
+    Output:
+        - slots: int array. The number of slots of each stratum.
+            Sums to less than the subgroups size if the capacities are too low.
+    """
+    total_capacity = np.sum(capacities)
+    if total_capacity <= subgroups_size:
+        return capacities.copy()
+    shares = capacities * subgroups_size / total_capacity
+    slots = np.minimum(np.floor(shares).astype(int), capacities)
+    for stratum in np.argsort(slots - shares):
+        if np.sum(slots) >= subgroups_size:
+            break
+        if slots[stratum] < capacities[stratum]:
+            slots[stratum] += 1
+    return slots
+
+def solve_stratum(values_by_group, subgroups_size, objective, annealing_parameters,
+                  deadline = None):
+    """
+    Matches a stratum by simulated annealing,
+    and returns the selected positions in each group.
+    If a deadline is given (as a time.time() value), the annealing stops there,
+    however long the stratum waited for a worker.
+    """
+    if deadline is not None:
+        annealing_parameters = dict(annealing_parameters,
+                                    time_limit = deadline - time.time())
+    _, selected_positions = annealing.anneal_selection(values_by_group,
+                                                       subgroups_size,
+                                                       objective,
+                                                       stop_event = worker_stop_event,
+                                                       **annealing_parameters)
+    return selected_positions
+
+def solve_by_strata(search_tree,
+                    num_strata,
+                    num_workers = None,
+                    max_iterations = 100000,
+                    time_limit = None,
+                    seed = None,
+                    temperature_schedule_name = "geometric",
+                    stop_event = None):
+    """
+    Computes a solution by stratified decomposition, for the groups,
+    subgroups size, feature matrix and objective of a search tree.
+    The solution becomes the current solution of the tree
+    (see SearchTree.get_current_solution).
+    Raises a RuntimeError if the worker processes fail to start,
+    e.g. from an unguarded multithreaded script (see get_process_context).
+    --
+    Input:
+        - search_tree: SearchTree. The search tree to solve for.
+        - num_strata: int. The number of strata.
+    Parameters:
+        - num_workers: int. The number of worker processes
+            (see get_process_context).
+            Defaults to None (the ProcessPoolExecutor default).
+        - max_iterations: int. The number of annealing moves,
+            split over the strata in proportion to their slots,
+            and for the final refinement. Defaults to 100000.
+        - time_limit: float. The maximal time of the whole decomposition,
+            in seconds. The final refinement only gets the time left
+            after the strata. Defaults to None (no limit).
+        - seed: int. The seed of the random generators.
+            Defaults to None (unseeded).
+        - temperature_schedule_name: string. The annealing temperature schedule.
+            Defaults to "geometric".
+        - stop_event: threading.Event. An event to stop the decomposition early.
+            Running strata return their best selection so far,
+            the others are cancelled, and the solution is completed greedily.
+            Defaults to None.
+    Output:
+        - distance: float. The distance of the solution.
+        - solution: int array. The solution, as the row chosen
+            for each tuple (line) and group (column).
+    """
+    objective = search_tree.root.objective
+    subgroups_size = search_tree.root.subgroups_size
+    rows_by_group, values_by_group = annealing.get_root_candidates(search_tree)
+    if any(len(values) < subgroups_size for values in values_by_group):
+        raise ValueError(f"Every group needs at least {subgroups_size} elements!")
+
+    strata = compute_strata(np.concatenate(values_by_group), num_strata)
+    strata_by_group = np.split(strata, np.cumsum([len(values)
+                                                  for values in values_by_group])[:-1])
+    positions_by_stratum = [[np.flatnonzero(group_strata == stratum)
+                             for group_strata in strata_by_group]
+                            for stratum in range(num_strata)]
+    capacities = np.array([min(len(positions) for positions in stratum_positions)
+                           for stratum_positions in positions_by_stratum])
+    slots = allocate_slots(capacities, subgroups_size)
+
+    seeds = np.random.SeedSequence(seed).spawn(num_strata + 1)
+    deadline = None if time_limit is None else time.time() + time_limit
+    selected_positions = [[] for _ in values_by_group]
+    process_context = get_process_context()
+    strata_stop_event = process_context.Event()
+    executor = ProcessPoolExecutor(max_workers = num_workers,
+                                   mp_context = process_context,
+                                   initializer = set_worker_stop_event,
+                                   initargs = (strata_stop_event,))
+    try:
+        positions_by_future = {}
+        for stratum in np.flatnonzero(slots):
+            stratum_positions = positions_by_stratum[stratum]
+            parameters = {"max_iterations": int(np.ceil(
+                              max_iterations * slots[stratum] / subgroups_size)),
+                          "seed": seeds[stratum],
+                          "temperature_schedule_name": temperature_schedule_name}
+            future = executor.submit(
+                solve_stratum,
+                [values[positions] for values, positions in zip(values_by_group,
+                                                                stratum_positions)],
+                int(slots[stratum]), objective, parameters, deadline)
+            positions_by_future[future] = stratum_positions
+        pending_futures = set(positions_by_future)
+        while pending_futures:
+            if stop_event is not None and stop_event.is_set():
+                # Running strata return their best selection so far.
+                strata_stop_event.set()
+                for future in pending_futures:
+                    future.cancel()
+                wait(pending_futures)
+                break
+            _, pending_futures = wait(pending_futures, timeout = STOP_POLL_INTERVAL,
+                                      return_when = FIRST_COMPLETED)
+        for future, stratum_positions in positions_by_future.items():
+            if not future.done() or future.cancelled():
+                continue
+            for group_position, positions in enumerate(future.result()):
+                selected_positions[group_position].extend(
+                    stratum_positions[group_position][positions])
+    except BrokenProcessPool as error:
+        raise RuntimeError("The worker processes solving the strata failed to start! "
+                           "When called from a multithreaded program, the entry "
+                           "point of its main script must be guarded by "
+                           "\"if __name__ == '__main__':\".") from error
+    finally:
+        strata_stop_event.set()
+        executor.shutdown(cancel_futures = True)
+
+    selected_positions = annealing.complete_selection(values_by_group, subgroups_size,
+                                                      objective, selected_positions)
+    distance, selected_positions = annealing.anneal_selection(
+        values_by_group, subgroups_size, objective,
+        max_iterations = max_iterations,
+        time_limit = None if deadline is None else deadline - time.time(),
+        seed = seeds[num_strata],
+        temperature_schedule_name = temperature_schedule_name,
+        stop_event = stop_event,
+        initial_positions = selected_positions)
+    solution = annealing.record_selection(search_tree, distance,
+                                          rows_by_group, selected_positions)
+    return distance, solution
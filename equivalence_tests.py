@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created: 19.10.2026
+
+This file is dedicated to the implementation and selection of stopping criteria
+based on equivalence tests between groups.
+Tests are computed from running per-group statistics of the raw matched values
+(see EquiTables.objectives.GroupStatistics), with NumPy only.
+Stopping criteria are functions that take such statistics and return a boolean.
+This boolean reflects wether or not the groups are considered equivalent,
+in which case the search can be stopped.
+Defined criteria should be added to the ALLOWED_STOPPING_CRITERION_NAMES dictionnary with their name.
+"""
+import math
+import numpy as np
+
+
+def compute_regularized_incomplete_beta(x, a, b, max_iterations = 200, epsilon = 1e-14):
+    """
+    Computes the regularized incomplete beta function I_x(a, b),
+    with Lentz's continued fraction evaluation.
+    --
+    Input:
+        - x: float. The upper bound of the integral, in [0, 1].
+        - a: float. The first shape parameter.
+        - b: float. The second shape parameter.
+    Parameters:
+        - max_iterations: int. The maximal number of fraction terms.
+            Defaults to 200.
+        - epsilon: float. The relative precision to reach. Defaults to 1e-14.
+    Output:
+        - value: float. The value of I_x(a, b).
+    """
+    if x <= 0:
+        return 0.
+    if x >= 1:
+        return 1.
+    if x > (a + 1) / (a + b + 2):
+        return 1. - compute_regularized_incomplete_beta(1 - x, b, a,
+                                                        max_iterations, epsilon)
+
+    log_front = (math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                 + a * math.log(x) + b * math.log(1 - x))
+    tiny = 1e-300
+    c = 1.
+    d = 1. - (a + b) * x / (a + 1)
+    d = 1. / (d if abs(d) > tiny else tiny)
+    fraction = d
+    for m in range(1, max_iterations + 1):
+        for numerator in [m * (b - m) * x / ((a + 2*m - 1) * (a + 2*m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2*m) * (a + 2*m + 1))]:
+            d = 1. + numerator * d
+            d = 1. / (d if abs(d) > tiny else tiny)
+            c = 1. + numerator / c
+            c = c if abs(c) > tiny else tiny
+            fraction *= c * d
+        if abs(c * d - 1.) < epsilon:
+            break
+    return math.exp(log_front) * fraction / a
+
+def compute_anova_p_values(statistics):
+    """
+    Computes the p-values of one-way ANOVAs between the groups,
+    for each column. With two groups, this is a (pooled variances) t-test.
+    Empty groups are ignored.
+    --
+    Input:
+        - statistics: GroupStatistics. The statistics of the raw values.
+    Output:
+        - p_values: float array. The p-value of each column.
+            Is NaN when there are not enough elements to run the test.
+    """
+    non_empty = statistics.counts > 0
+    counts = statistics.counts[non_empty][:, None]
+    sums = statistics.sums[non_empty]
+    squares = statistics.squares[non_empty]
+    num_groups = counts.shape[0]
+    num_elements = np.sum(counts)
+
+    between_squares = (np.sum(sums**2 / counts, axis=0)
+                       - np.sum(sums, axis=0)**2 / num_elements)
+    within_squares = np.sum(squares - sums**2 / counts, axis=0)
+    between_freedom = num_groups - 1
+    within_freedom = num_elements - num_groups
+
+    p_values = np.full(sums.shape[1], np.nan)
+    for column, (between, within) in enumerate(zip(between_squares, within_squares)):
+        scale = max(abs(between), abs(within), 1e-300)
+        if between_freedom < 1 or between <= 1e-12 * scale:
+            p_values[column] = 1.
+        elif within <= 1e-12 * scale:
+            p_values[column] = 0. if within_freedom > 0 else np.nan
+        elif within_freedom > 0:
+            f_value = (between / between_freedom) / (within / within_freedom)
+            p_values[column] = compute_regularized_incomplete_beta(
+                within_freedom / (within_freedom + between_freedom * f_value),
+                within_freedom / 2,
+                between_freedom / 2
+            )
+    return p_values
+
+def compute_max_standardized_mean_differences(statistics):
+    """
+    Computes the largest absolute standardized mean difference
+    (Cohen's d, with pooled standard deviation) over every pair of groups,
+    for each column.
+    Empty groups are ignored.
+    --
+    Input:
+        - statistics: GroupStatistics. The statistics of the raw values.
+    Output:
+        - differences: float array. The largest difference for each column.
+    """
+    non_empty = statistics.counts > 0
+    counts = statistics.counts[non_empty][:, None]
+    means = statistics.get_means()[non_empty]
+    deviations_squares = statistics.squares[non_empty] - counts * means**2
+
+    differences = np.zeros(means.shape[1])
+    for group1, group2 in zip(*np.triu_indices(means.shape[0], 1)):
+        freedom = counts[group1] + counts[group2] - 2
+        pooled_variances = np.maximum(
+            deviations_squares[group1] + deviations_squares[group2], 0
+        ) / np.maximum(freedom, 1)
+        mean_differences = np.abs(means[group1] - means[group2])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pair_differences = np.where(
+                mean_differences == 0, 0., mean_differences / np.sqrt(pooled_variances)
+            )
+        differences = np.maximum(differences, pair_differences)
+    return differences
+
+def has_min_p_value(statistics, threshold):
+    return bool(np.all(compute_anova_p_values(statistics) >= threshold))
+
+def has_max_standardized_mean_difference(statistics, threshold):
+    return bool(np.all(compute_max_standardized_mean_differences(statistics) <= threshold))
+
+ALLOWED_STOPPING_CRITERION_NAMES = {
+    'min_p_value': lambda t : lambda statistics : has_min_p_value(statistics, t),
+    'max_smd': lambda t : lambda statistics : has_max_standardized_mean_difference(statistics, t)
+}
+
+def get_stopping_criterion_by_name(criterion_name, threshold):
+    """
+    This function retrieves a given stopping criterion by its name,
+    built with a threshold.
+    If the name is not valid, returns None (no stopping criterion),
+    and raises a warning.
+    --
+    Input:
+        - criterion_name: string. The name of the criterion.
+            Current possible options are:
+                + min_p_value: every column has an ANOVA p-value
+                    of at least the threshold.
+                + max_smd: every column has a standardized mean difference
+                    of at most the threshold, for every pair of groups.
+        - threshold: float. The threshold of the criterion.
+    Outputs:
+        - stopping_criterion: GroupStatistics -> bool. The chosen criterion.
+            Is None for invalid names.
+    """
+    if criterion_name in ALLOWED_STOPPING_CRITERION_NAMES:
+        return ALLOWED_STOPPING_CRITERION_NAMES[criterion_name](threshold)
+    print(  f"WARNING: invalid name - {criterion_name}!\n"+
+            "Resolving to no stopping criterion.")
+    return None
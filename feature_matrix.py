@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created: 19.10.2026
+
+This file is dedicated to compiled feature matrices.
+A feature matrix holds the values of the matched columns for every element,
+transformed once according to a metric (see EquiTables.metrics),
+so that searches only compute plain squared euclidian distances on it.
+Feature matrices are built from plain arrays (see build_feature_matrix);
+dataframes are compiled into one at the edges (see EquiTables.preprocessing).
+"""
+import numpy as np
+import metrics
+
+
+class FeatureMatrix():
+    """
+    Matched values of the elements of all groups, as a single array.
+    """
+
+    def __init__(self, raw_values, rows_by_group, column_names,
+                 metric_name = "euclidian", weights = None):
+        """
+        Input:
+            - raw_values: float array. The matched values,
+                one row per element and one column per matched variable.
+            - rows_by_group: int dict dict. The row of each element
+                in the values, by element index, by group id.
+            - column_names: string list. The names of the matched columns.
+        Parameters:
+            - metric_name: string. The name of the metric to transform with.
+                See EquiTables.metrics for details. Defaults to "euclidian".
+            - weights: float list. The weight of each column.
+                Defaults to None (equal weights).
+        """
+        self.raw_values = np.asarray(raw_values, dtype=float)
+        self.rows_by_group = rows_by_group
+        self.group_ids = list(rows_by_group.keys())
+        self.group_positions = {group_id: group_position
+            for group_position, group_id in enumerate(self.group_ids)}
+        # Integer views: the rows of each group (by group position),
+        # and the element index and position in its group of each row.
+        self.group_rows = [np.fromiter(rows_by_group[group_id].values(), dtype=int,
+                                       count=len(rows_by_group[group_id]))
+                           for group_id in self.group_ids]
+        self.group_sizes = np.array([len(rows) for rows in self.group_rows], dtype=int)
+        self.row_elements = [None] * self.raw_values.shape[0]
+        self.row_positions = np.zeros(self.raw_values.shape[0], dtype=int)
+        for group_id, rows in zip(self.group_ids, self.group_rows):
+            for element_index, row in rows_by_group[group_id].items():
+                self.row_elements[row] = element_index
+            self.row_positions[rows] = np.arange(len(rows))
+        self.column_names = list(column_names)
+        self.weights = metrics.validate_weights(weights, len(self.column_names))
+
+        metric_transform = metrics.get_metric_transform_by_name(metric_name)
+        # Invalid names resolve to the default metric: keep the one actually used.
+        self.metric_name = next(name for name, transform
+                                in metrics.ALLOWED_METRIC_NAMES.items()
+                                if transform is metric_transform)
+        self.values = metric_transform(self.raw_values, self.weights)
+
+    def __repr__(self):
+        return (f"FeatureMatrix({self.values.shape[0]} elements, "
+                f"columns {self.column_names}, metric '{self.metric_name}')")
+
+    def get_row(self, group_id, element_index):
+        """
+        Returns the row of an element in the values.
+        """
+        return self.rows_by_group[group_id][element_index]
+
+    def get_rows(self, group_id, element_indices):
+        """
+        Returns the rows of several elements of a group in the values.
+        """
+        rows_by_element = self.rows_by_group[group_id]
+        return [rows_by_element[element_index] for element_index in element_indices]
+
+    def get_values(self, group_id, element_indices):
+        """
+        Returns the transformed values of several elements of a group.
+        """
+        return self.values[self.get_rows(group_id, element_indices)]
+
+    def get_elements(self, rows):
+        """
+        Returns the element indices of several rows.
+        """
+        return [self.row_elements[row] for row in rows]
+
+
+def build_feature_matrix(values,
+                         group_ids,
+                         element_ids = None,
+                         column_names = None,
+                         metric_name = "euclidian",
+                         weights = None):
+    """
+    Builds the feature matrix of elements given as plain arrays.
+    Groups are ordered by id, and elements by row within their group.
+    Raises a ValueError if two elements of a group share an id.
+    --
+    Input:
+        - values: float array. The matched values,
+            one row per element and one column per matched variable.
+        - group_ids: array. The id (e.g. an integer) of the group of each element.
+    Parameters:
+        - element_ids: array. The id of each element.
+            Defaults to None (the row numbers).
+        - column_names: string list. The names of the matched columns.
+            Defaults to None (the column numbers).
+        - metric_name: string. The name of the metric to transform with.
+            Defaults to "euclidian".
+        - weights: float list. The weight of each matched column.
+            Defaults to None (equal weights).
+    Output:
+        - feature_matrix: FeatureMatrix. The built feature matrix.
+    """
+    values = np.asarray(values, dtype=float)
+    if element_ids is None:
+        element_ids = np.arange(values.shape[0])
+    if column_names is None:
+        column_names = [str(column) for column in range(values.shape[1])]
+    unique_group_ids, group_positions = np.unique(np.asarray(group_ids),
+                                                  return_inverse=True)
+    rows_by_group = {group_id.item() if isinstance(group_id, np.generic) else group_id: {}
+                     for group_id in unique_group_ids}
+    group_ids_by_position = list(rows_by_group.keys())
+    for row, (group_position, element_id) in enumerate(zip(group_positions.tolist(),
+                                                           np.asarray(element_ids).tolist())):
+        group_rows = rows_by_group[group_ids_by_position[group_position]]
+        if element_id in group_rows:
+            raise ValueError(f"Duplicate element id {element_id} "
+                             f"in group {group_ids_by_position[group_position]}!")
+        group_rows[element_id] = row
+    return FeatureMatrix(values,
+                         rows_by_group,
+                         column_names,
+                         metric_name = metric_name,
+                         weights = weights)
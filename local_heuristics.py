@@ -6,49 +6,185 @@ Created: 31/03/2021
 
 This file is dedicated to the implementation and selection of local heuristics.
 Heuristics are functions that take a node and return, in this very order:
-    - the chosen element;
-    - the index of the subgroup it will be part of;
+    - the chosen element (its row in the feature matrix);
+    - the position of the subgroup it will be part of;
     - the index of the tuple it will be part of;
     - a score for this choice.
 Defined heuristics should be added to the ALLOWED_LOCAL_HEURISTIC_NAMES dictionnary with their name.
+
+Heuristics fill the first slot (a tuple and group) given by a slot ordering.
+Slot orderings are functions that take a node and return its open slots,
+as listed by list_open_slots, in the order to fill them.
+Defined orderings should be added to the ALLOWED_SLOT_ORDERING_NAMES dictionnary with their name.
+
+Candidates of large groups can be scored on several threads:
+they are split into chunks, scored concurrently (NumPy releases the GIL
+in large array operations), and the best candidate of each chunk
+is reduced to the best overall.
 """
 
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import metrics
 
-def choose_first_possible(node):
-    for (tuple_index, subgroup_id, element_index) in node.list_possible_decisions():
-        return element_index, subgroup_id, tuple_index, 0
-
-def find_nearest(dataframe, chosen_indices, subgroup_index, subgroup_possible_indices):
-    mindistance = np.Inf
-    for candidate in subgroup_possible_indices:
-        candidate_tuple = chosen_indices.copy()
-        candidate_tuple[subgroup_index] = candidate
-        dist = metrics.compute_distance_within_tuple(candidate_tuple, dataframe)
-        if dist < mindistance:
-            mindistance = dist
-            best_candidate = candidate
-    return best_candidate, mindistance
-
-
-def choose_nearest(node):
-    for tuple_index, subgroup_id, possible_indices in node.list_choices_to_make():
-        if len(possible_indices) > 0 :
-            chosen_indices = node.subgroups_chosen_indices_tuples[tuple_index]
-            chosen_element, score = find_nearest(node.groups_dataframe,
-                                              chosen_indices,
-                                              subgroup_id,
-                                              possible_indices)
-            return chosen_element, subgroup_id, tuple_index, score
+# Smallest number of candidates scored by a thread,
+# below which threading costs more than it saves.
+MIN_CHUNK_SIZE = 8192
+
+thread_pools_by_size = {}
+thread_pools_lock = threading.Lock()
+
+############# Candidate scoring
+
+def get_thread_pool(num_threads):
+    """
+    Returns a thread pool of a given size, shared by all searches.
+    """
+    with thread_pools_lock:
+        if num_threads not in thread_pools_by_size:
+            thread_pools_by_size[num_threads] = ThreadPoolExecutor(
+                max_workers = num_threads, thread_name_prefix = "scoring")
+        return thread_pools_by_size[num_threads]
+
+def find_best_in_chunk(score_candidates, candidate_rows):
+    scores = score_candidates(candidate_rows)
+    best_position = np.argmin(scores)
+    return scores[best_position], int(candidate_rows[best_position])
+
+def find_best_candidate(score_candidates, candidate_rows, num_threads = 1):
+    """
+    Finds the candidate with the lowest score.
+    Large candidate sets are split into chunks scored concurrently.
+    --
+    Input:
+        - score_candidates: function. Returns the scores
+            of an array of candidate rows.
+        - candidate_rows: int array. The rows of the candidates.
+    Parameters:
+        - num_threads: int. The largest number of threads to use.
+            Defaults to 1.
+    Output:
+        - best_row: int. The row of the best candidate.
+            The first one in case of ties.
+        - best_score: float. Its score.
+    """
+    num_chunks = min(num_threads, len(candidate_rows) // MIN_CHUNK_SIZE)
+    if num_chunks <= 1:
+        best_score, best_row = find_best_in_chunk(score_candidates, candidate_rows)
+        return best_row, best_score
+    best_by_chunk = get_thread_pool(num_threads).map(
+        functools.partial(find_best_in_chunk, score_candidates),
+        np.array_split(candidate_rows, num_chunks))
+    best_score, best_row = min(best_by_chunk, key = lambda best: best[0])
+    return best_row, best_score
+
+############# Slot orderings
+
+def order_slots_fixed(node):
+    return node.list_open_slots()
+
+def order_slots_by_fewest_candidates(node):
+    candidates_counts = [(node.get_num_candidates(*slot), slot)
+                         for slot in node.list_open_slots()]
+    return [slot for num_candidates, slot in sorted(candidates_counts,
+                                                    key=lambda count: count[0])
+            if num_candidates > 0]
+
+def order_slots_by_largest_best_cost(node):
+    open_slots = [slot for slot in node.list_open_slots()
+                  if node.get_num_candidates(*slot) > 0]
+    best_costs = [find_best_for_objective(node, subgroup_position,
+                                          node.get_candidate_rows(tuple_index,
+                                                                  subgroup_position))[1]
+                  for tuple_index, subgroup_position in open_slots]
+    return [open_slots[position] for position in np.argsort(best_costs, kind="stable")[::-1]]
+
+ALLOWED_SLOT_ORDERING_NAMES = {
+    'fixed': order_slots_fixed,
+    'fewest_candidates': order_slots_by_fewest_candidates,
+    'largest_best_cost': order_slots_by_largest_best_cost
+}
+
+############# Heuristics
+
+def choose_first_possible(node, slot_ordering = order_slots_fixed):
+    for tuple_index, subgroup_position in slot_ordering(node):
+        candidate_rows = node.get_candidate_rows(tuple_index, subgroup_position)
+        if len(candidate_rows) > 0:
+            return int(candidate_rows[0]), subgroup_position, tuple_index, 0
+
+def find_nearest(feature_matrix, tuple_rows, candidate_rows, num_threads = 1):
+    tuple_values = feature_matrix.values[tuple_rows]
+    def score_candidates(rows):
+        return metrics.compute_squared_distances_to_tuple(
+            feature_matrix.values[rows], tuple_values)
+    return find_best_candidate(score_candidates, candidate_rows, num_threads)
+
+
+def choose_nearest(node, slot_ordering = order_slots_fixed, num_threads = 1):
+    for tuple_index, subgroup_position in slot_ordering(node):
+        candidate_rows = node.get_candidate_rows(tuple_index, subgroup_position)
+        if len(candidate_rows) > 0 :
+            chosen_row, score = find_nearest(node.feature_matrix,
+                                             node.get_tuple_rows(tuple_index),
+                                             candidate_rows,
+                                             num_threads)
+            return chosen_row, subgroup_position, tuple_index, score
+
+def find_best_for_objective(node, subgroup_position, candidate_rows, num_threads = 1):
+    def score_candidates(rows):
+        return node.objective.compute_distances_if_added(
+            node.group_statistics,
+            subgroup_position,
+            node.feature_matrix.values[rows])
+    return find_best_candidate(score_candidates, candidate_rows, num_threads)
+
+
+def choose_best_for_objective(node, slot_ordering = order_slots_fixed, num_threads = 1):
+    for tuple_index, subgroup_position in slot_ordering(node):
+        candidate_rows = node.get_candidate_rows(tuple_index, subgroup_position)
+        if len(candidate_rows) > 0 :
+            chosen_row, score = find_best_for_objective(node,
+                                                        subgroup_position,
+                                                        candidate_rows,
+                                                        num_threads)
+            return chosen_row, subgroup_position, tuple_index, score
 
 
 ALLOWED_LOCAL_HEURISTIC_NAMES = {
     'first_possible': choose_first_possible,
-    'simple_nearest': choose_nearest
+    'simple_nearest': choose_nearest,
+    'objective_nearest': choose_best_for_objective
 }
 
-def get_local_heuristic_by_name(heuristic_name):
+def get_slot_ordering_by_name(slot_ordering_name):
+    """
+    This function retrieves a given slot ordering by its name.
+    If the name is not valid, returns "fixed" ordering,
+    and raises a warning.
+    --
+    Input:
+        - slot_ordering_name: string. The name of the ordering.
+            Current possible options are:
+                + fixed: tuple then group order.
+                + fewest_candidates: the slot with the fewest candidates first.
+                + largest_best_cost: the slot whose best candidate
+                    increases the objective the most first.
+    Outputs:
+        - slot_ordering: slot ordering. The chosen slot ordering.
+            Is "fixed" ordering by default for invalid names.
+    """
+    if slot_ordering_name in ALLOWED_SLOT_ORDERING_NAMES:
+        return ALLOWED_SLOT_ORDERING_NAMES[slot_ordering_name]
+    default_slot_ordering_name = list(ALLOWED_SLOT_ORDERING_NAMES.keys())[0]
+    print(  f"WARNING: invalid name - {slot_ordering_name}!\n"+
+            f"Resolving to default slot ordering '{default_slot_ordering_name}'.")
+    return ALLOWED_SLOT_ORDERING_NAMES[default_slot_ordering_name]
+
+def get_local_heuristic_by_name(heuristic_name, slot_ordering_name = None,
+                                num_threads = 1):
     """
     This function retrieves a given local heuristic by its name.
     If the name is not valid, returns "first_possible" heuristic,
@@ -59,14 +195,29 @@ def get_local_heuristic_by_name(heuristic_name):
             Current possible options are:
                 + first_possible
                 + simple_nearest
+                + objective_nearest
+    Parameters:
+        - slot_ordering_name: string. The name of the slot ordering
+            for the heuristic to use. Defaults to None ("fixed" ordering).
+        - num_threads: int. The number of threads scoring the candidates
+            of large groups, for the nearest heuristics. Defaults to 1.
     Outputs:
         - local_heuristic: local_heuristic. The chosen local heuristic.
             Is "first_possible" heuristic by default for invalid names.
 
     """
-    if heuristic_name in ALLOWED_LOCAL_HEURISTIC_NAMES:
-        return ALLOWED_LOCAL_HEURISTIC_NAMES[heuristic_name]
-    default_local_heuristic_name = list(ALLOWED_LOCAL_HEURISTIC_NAMES.keys())[0]
-    print(  f"WARNING: invalid name - {heuristic_name}!\n"+
-            f"Resolving to default heuristic '{default_local_heuristic_name}'.")
-    return ALLOWED_LOCAL_HEURISTIC_NAMES[default_local_heuristic_name]
+    if heuristic_name not in ALLOWED_LOCAL_HEURISTIC_NAMES:
+        default_local_heuristic_name = list(ALLOWED_LOCAL_HEURISTIC_NAMES.keys())[0]
+        print(  f"WARNING: invalid name - {heuristic_name}!\n"+
+                f"Resolving to default heuristic '{default_local_heuristic_name}'.")
+        heuristic_name = default_local_heuristic_name
+    local_heuristic = ALLOWED_LOCAL_HEURISTIC_NAMES[heuristic_name]
+    heuristic_parameters = {}
+    if slot_ordering_name is not None:
+        heuristic_parameters["slot_ordering"] = get_slot_ordering_by_name(
+            slot_ordering_name)
+    if num_threads > 1 and local_heuristic is not choose_first_possible:
+        heuristic_parameters["num_threads"] = num_threads
+    if not heuristic_parameters:
+        return local_heuristic
+    return functools.partial(local_heuristic, **heuristic_parameters)
@@ -11,13 +11,25 @@ Github repository: https://github.com/MaximeCaute/Equitables
 
 import os.path as op
 import argparse
+import time
+import numpy as np
 import pandas as pd
 
+import annealing
+import binary_cache
+import decomposition
+
 import local_heuristics
 import global_heuristics
+import equivalence_tests
+import metrics
+import objectives
 import preprocessing
+import solution_files
+from preprocessing import compile_feature_matrix
 from search_tree import SearchTree
 
+ALLOWED_SOLVER_NAMES = ['tree_search', 'annealing']
 
 def split_by_labels(df, factors):
     """
@@ -38,13 +50,87 @@ def split_by_labels(df, factors):
     return df.drop(factors, axis=1).groupby(x)
 
 
+def prepare_grouped_dataframe(df, variables_to_match, grouping_factors):
+    """
+    Keeps the relevant columns of a dataframe and splits it
+    according to the grouping factors.
+    --
+    Input:
+        - df: pd.DataFrame. The dataframe to prepare.
+        - variables_to_match: string list. The names of the columns to match.
+        - grouping_factors: string list.
+            The name of the columns to split the dataframe over.
+    Output:
+        - grouped_df: pd.DataFrameGroupBy.
+            The dataframe grouped by factored groups.
+    """
+    df = preprocessing.drop_non_relevant_columns(
+        df, variables_to_match + grouping_factors)
+    return split_by_labels(df, grouping_factors)
+
+
+def get_subgroup_dataframe(grouped_dataframe, feature_matrix, solution):
+    """
+    Materializes a solution of a search as subgroups of a grouped dataframe.
+    --
+    Input:
+        - grouped_dataframe: pd.DataFrameGroupBy.
+            The grouped dataframe the feature matrix was compiled from.
+        - feature_matrix: FeatureMatrix. The compiled feature matrix.
+        - solution: int array. The solution, as the row chosen
+            for each tuple (line) and group (column) of the feature matrix.
+    Output:
+        - subgrouped_dataframe: pd.DataFrameGroupBy.
+            The dataframe made of the selected elements, grouped by group.
+    """
+    if solution is None:
+        raise ValueError("No solution was found by the search!")
+    group_dataframes = []
+    grouping = []
+    for group_position, group_id in enumerate(feature_matrix.group_ids):
+        # Element indices are only unique within a group.
+        selected_indices = feature_matrix.get_elements(solution[:, group_position])
+        group_dataframe = grouped_dataframe.get_group(group_id)
+        group_dataframe = group_dataframe[group_dataframe.index.isin(selected_indices)]
+        group_dataframes.append(group_dataframe)
+        grouping += [group_id] * len(group_dataframe)
+    return pd.concat(group_dataframes).groupby(grouping)
+
+
 def find_matched_subgroups(grouped_dataframe,
                            columns_to_match,
                            local_heuristic,
                            global_heuristic,
-                           subgroup_size=2):
+                           subgroup_size=2,
+                           metric_name="euclidian",
+                           weights=None,
+                           objective_name="pairwise",
+                           checkpoint_path=None,
+                           checkpoint_interval=5.,
+                           resume=False,
+                           stopping_criterion_name=None,
+                           stopping_threshold=None,
+                           feature_matrix=None,
+                           max_iterations=10000,
+                           time_limit=None,
+                           stop_event=None,
+                           num_solutions=None,
+                           min_difference=1,
+                           solver_name="tree_search",
+                           seed=None,
+                           temperature_schedule_name="geometric",
+                           num_strata=None,
+                           num_workers=None,
+                           solution_path=None,
+                           previous_solution_path=None,
+                           max_memory=None,
+                           measure_memory=False):
     """
     Computes matched subgroups from a grouped dataframe.
+    Raises a ValueError if the tree search finds no solution,
+    e.g. when the memory budget is too small for a single one,
+    or if the "min_p_value" stopping criterion is used with subgroups
+    of a single element, for which the ANOVA has no p-value.
     --
     Input:
         - grouped_dataframe: pd.DataFrameGroupBy.
@@ -59,15 +145,218 @@ def find_matched_subgroups(grouped_dataframe,
     Parameters:
         - subgroup_size: int. The size of the subgroups to compute.
             Defaults to 2.
+        - metric_name: string. The name of the metric to match with.
+            See EquiTables.metrics for details. Defaults to "euclidian".
+        - weights: float list. The weight of each column to match,
+            in the same order. Defaults to None (equal weights).
+        - objective_name: string. The name of the objective to minimize.
+            See EquiTables.objectives for details. Defaults to "pairwise".
+        - checkpoint_path: string. A file to periodically save
+            the state of the search to. Defaults to None (no checkpoint).
+        - checkpoint_interval: float. The minimal time between two
+            checkpoints, in seconds. Defaults to 5.
+        - resume: bool. Whether to resume the search from the checkpoint file,
+            if it exists. Defaults to False.
+        - stopping_criterion_name: string. The name of the criterion
+            to stop the search at the first solution meeting it,
+            which is then the only one returned.
+            See EquiTables.equivalence_tests for details.
+            Defaults to None (search until the end).
+        - stopping_threshold: float. The threshold of the stopping criterion.
+            Defaults to None.
+        - feature_matrix: FeatureMatrix. An already compiled feature matrix
+            of the grouped dataframe, for the same columns, metric and weights.
+            Defaults to None (compiled here).
+        - max_iterations: int. The maximal number of search iterations.
+            Defaults to 10000.
+        - time_limit: float. The maximal search time, in seconds.
+            Defaults to None (no limit).
+        - stop_event: threading.Event. An event to stop the search early.
+            Defaults to None.
+        - num_solutions: int. If given, the number of best distinct solutions
+            to return, as a list. Defaults to None (single solution).
+        - min_difference: int. The minimal number of elements
+            by which returned solutions differ. Defaults to 1.
+        - solver_name: string. The name of the solver to use,
+            either "tree_search" or "annealing" (simulated annealing,
+            see EquiTables.annealing). The annealing solver ignores
+            the heuristics, checkpoints and stopping criterion,
+            and returns a single solution, warning about ignored options.
+            Defaults to "tree_search".
+        - seed: int. The seed of the annealing solver.
+            Defaults to None (unseeded).
+        - temperature_schedule_name: string. The name of the temperature
+            schedule of the annealing solver. Defaults to "geometric".
+        - num_strata: int. If given, the number of strata to decompose
+            the problem into, each being solved by annealing
+            before merging (see EquiTables.decomposition).
+            Overrides the solver. Defaults to None (no decomposition).
+        - num_workers: int. The number of worker processes
+            solving the strata. Defaults to None (one per processor).
+        - solution_path: string. A file to write the best solutions to,
+            to re-match from later (see EquiTables.solution_files).
+            Defaults to None (no file).
+        - previous_solution_path: string. A solution file from an earlier
+            version of the data. Its elements that are still in their group
+            are kept, and the search only fills the remaining slots,
+            first looking for solutions beating the previous distance.
+            If none does, the search starts over without that distance,
+            within the remaining iterations and time.
+            Only applies to the tree search. Defaults to None (new search).
+        - max_memory: int. The approximate memory budget of the tree search,
+            in bytes. Once reached, explored nodes are forgotten, and
+            the search stops if its current path alone exceeds the budget.
+            Defaults to None (no budget).
+        - measure_memory: bool. Whether to print the growth of the approximate
+            memory held by the tree search, along with that of the memory
+            traced by tracemalloc. Defaults to False.
     Outputs:
         - subgrouped_dataframe: pd.DataFrameGroupBy.
             The dataframe made of the subgroups of the original dataframe.
             Non-grouped elements have been removed.
+            Is a list of such dataframes, from the best to the worst,
+            if num_solutions is given.
+    """
+    if feature_matrix is None:
+        feature_matrix = compile_feature_matrix(grouped_dataframe,
+                                                columns_to_match,
+                                                metric_name=metric_name,
+                                                weights=weights)
+    if stopping_criterion_name == "min_p_value" and subgroup_size < 2:
+        raise ValueError("The min_p_value stopping criterion "
+                         "requires subgroups of at least 2 elements!")
+    objective = objectives.get_objective_by_name(objective_name)
+    stopping_criterion = (
+        None if stopping_criterion_name is None
+        else equivalence_tests.get_stopping_criterion_by_name(
+            stopping_criterion_name, stopping_threshold)
+    )
+    search_tree = SearchTree(feature_matrix, subgroup_size, objective,
+                             num_solutions=(1 if num_solutions is None
+                                            else num_solutions),
+                             min_difference=min_difference)
+    if num_strata is not None and num_strata > 1:
+        decomposition.solve_by_strata(search_tree,
+                                      num_strata,
+                                      num_workers=num_workers,
+                                      max_iterations=max_iterations,
+                                      time_limit=time_limit,
+                                      seed=seed,
+                                      temperature_schedule_name=temperature_schedule_name,
+                                      stop_event=stop_event)
+    elif solver_name == "annealing":
+        annealing.anneal(search_tree,
+                         max_iterations=max_iterations,
+                         time_limit=time_limit,
+                         seed=seed,
+                         temperature_schedule_name=temperature_schedule_name,
+                         stop_event=stop_event)
+    if (num_strata is not None and num_strata > 1) or solver_name == "annealing":
+        if previous_solution_path is not None:
+            print("WARNING: re-matching only applies to the tree search!\n"+
+                  "The previous solution was ignored.")
+        if num_solutions is not None and num_solutions > 1:
+            print("WARNING: several solutions only apply to the tree search!\n"+
+                  "Returning a single solution.")
+        if stopping_criterion is not None:
+            print("WARNING: stopping criteria only apply to the tree search!\n"+
+                  f"The {stopping_criterion_name} criterion was ignored.")
+        if checkpoint_path is not None:
+            print("WARNING: checkpoints only apply to the tree search!\n"+
+                  "No checkpoint was saved or resumed.")
+        if solution_path is not None:
+            solution_files.save_solution_file(search_tree, solution_path,
+                                              objective_name)
+        solution_dataframe = get_subgroup_dataframe(grouped_dataframe, feature_matrix,
+                                                    search_tree.get_current_solution())
+        if num_solutions is not None:
+            return [solution_dataframe]
+        return solution_dataframe
+    if solver_name not in ALLOWED_SOLVER_NAMES:
+        print(f"WARNING: invalid name - {solver_name}!\n"+
+              f"Resolving to default solver '{ALLOWED_SOLVER_NAMES[0]}'.")
+    previous_solution = None
+    if previous_solution_path is not None:
+        previous_solution = solution_files.load_solution_file(previous_solution_path)
+        fix_previous_solution(search_tree, previous_solution, objective_name)
+    if resume and checkpoint_path is not None:
+        if op.exists(checkpoint_path):
+            search_tree.load_checkpoint(checkpoint_path)
+        else:
+            print(f"WARNING: no checkpoint found at {checkpoint_path}!\n"+
+                  "Starting a new search instead.")
+    search_parameters = {"max_iterations": max_iterations,
+                         "checkpoint_path": checkpoint_path,
+                         "checkpoint_interval": checkpoint_interval,
+                         "stopping_criterion": stopping_criterion,
+                         "time_limit": time_limit,
+                         "stop_event": stop_event,
+                         "max_memory": max_memory,
+                         "measure_memory": measure_memory}
+    start_time = time.monotonic()
+    search_tree.search(local_heuristic, global_heuristic, **search_parameters)
+    if (not search_tree.best_solutions and search_tree.initial_bound < np.inf
+            and (stop_event is None or not stop_event.is_set())):
+        # No completion beats the previous distance: search again without it,
+        # within what remains of the budget.
+        search_parameters["max_iterations"] = max_iterations - search_tree.num_iterations
+        if time_limit is not None:
+            search_parameters["time_limit"] = time_limit - (time.monotonic() - start_time)
+        if (search_parameters["max_iterations"] > 0
+                and (time_limit is None or search_parameters["time_limit"] > 0)):
+            search_tree = SearchTree(feature_matrix, subgroup_size, objective,
+                                     num_solutions=search_tree.num_solutions,
+                                     min_difference=min_difference)
+            fix_previous_solution(search_tree, previous_solution, objective_name,
+                                  use_bound=False)
+            search_tree.search(local_heuristic, global_heuristic, **search_parameters)
+    if measure_memory:
+        print(f"Search memory growth: {search_tree.memory_measurement['estimated']} "
+              f"bytes estimated, {search_tree.memory_measurement['traced']} bytes traced.")
+    if not search_tree.best_solutions:
+        if search_tree.exceeded_memory_budget:
+            raise ValueError(f"The memory budget of {max_memory} bytes was exceeded "
+                             "before any solution was found!")
+        raise ValueError("No solution was found by the search!")
+    if solution_path is not None:
+        solution_files.save_solution_file(search_tree, solution_path,
+                                          objective_name)
+    if num_solutions is not None:
+        return [get_subgroup_dataframe(grouped_dataframe, feature_matrix, solution)
+                for _, solution in search_tree.get_best_solutions()]
+    return get_subgroup_dataframe(grouped_dataframe, feature_matrix,
+                                  search_tree.get_current_solution())
+
+def fix_previous_solution(search_tree, previous_solution, objective_name,
+                          use_bound=True):
     """
-    search_tree = SearchTree(grouped_dataframe, subgroup_size)
-    subgrouped_dataframe = search_tree.search_and_get_solution( local_heuristic,
-                                                                global_heuristic)
-    return subgrouped_dataframe
+    Fixes the elements of a previous solution that are still in their group
+    in the subgroups of a (fresh) search tree.
+    If some slots are left to fill, and the previous solution was computed
+    with the same parameters, its distance becomes the initial bound
+    of the search. This is not the case for metrics fitted on the data
+    (see EquiTables.metrics), whose distances changed with the data.
+    --
+    Input:
+        - search_tree: SearchTree. The search tree.
+        - previous_solution: dict. The content of a solution file.
+            See EquiTables.solution_files for details.
+        - objective_name: string. The name of the objective of the search.
+    Parameters:
+        - use_bound: bool. Whether to use the previous distance as a bound.
+            Defaults to True.
+    """
+    best_previous_solution = previous_solution["solutions"][0]
+    search_tree.fix_elements(best_previous_solution["subgroups"])
+    feature_matrix = search_tree.root.feature_matrix
+    if (use_bound and not search_tree.root.is_leaf()
+            and previous_solution["subgroups_size"] == search_tree.root.subgroups_size
+            and previous_solution["objective_name"] == objective_name
+            and previous_solution["metric_name"] == feature_matrix.metric_name
+            and feature_matrix.metric_name not in metrics.DATA_DEPENDENT_METRIC_NAMES
+            and previous_solution["column_names"] == feature_matrix.column_names
+            and previous_solution.get("weights") == feature_matrix.weights.tolist()):
+        search_tree.initial_bound = best_previous_solution["distance"]
 
 if __name__ == "__main__":
     """
@@ -79,6 +368,19 @@ if __name__ == "__main__":
         - python3 match.py ToySets/toy_data.csv -m Value -g Control -s 2 -p results/
         - python3 match.py ToySets/toy_data_expanded.csv -m Value -g "Control;Paradigm1;Paradigm2" -s 2 -p results/
         - python3 match.py ToySets/toy_data_expanded.csv -m Value -g "Control;Paradigm1;Paradigm2" -h first_possible -s 2 -p results/
+        - python3 match.py ToySets/toy_data_expanded.csv -m "Value;Paradigm1" -g "Control;Paradigm2" -s 2 --metric_name standardized --weights "2;1"
+        - python3 match.py ToySets/toy_data_expanded.csv -m Value -g "Control;Paradigm1" -s 2 --objective_name means_and_variances -h objective_nearest
+        - python3 match.py ToySets/toy_data_expanded.csv -m Value -g "Control;Paradigm1" -s 2 --stopping_criterion_name max_smd --stopping_threshold 0.2
+        - python3 match.py ToySets/toy_data_expanded.csv -m Value -g "Control;Paradigm1" -s 2 --num_solutions 3 --min_difference 2 -p results/
+        - python3 match.py ToySets/toy_data_expanded.csv -m Value -g "Control;Paradigm1;Paradigm2" -h simple_nearest --slot_ordering_name fewest_candidates -s 2
+        - python3 match.py ToySets/toy_data_expanded.csv -m Value -g "Control;Paradigm1;Paradigm2" -s 2 --binary_cache
+        - python3 match.py ToySets/toy_data_expanded.csv -m Value -g "Control;Paradigm1;Paradigm2" -h simple_nearest -s 2 --num_threads 4
+        - python3 match.py ToySets/toy_data_expanded.csv -m Value -g "Control;Paradigm1;Paradigm2" -s 2 --checkpoint_path search.ckpt --resume
+        - python3 match.py ToySets/toy_data_expanded.csv -m Value -g "Control;Paradigm1;Paradigm2" -s 2 --max_memory 64 --measure_memory
+        - python3 match.py ToySets/toy_data_expanded.csv -m Value -g "Control;Paradigm1;Paradigm2" -s 2 --solver_name annealing --seed 0 --max_iterations 100000
+        - python3 match.py ToySets/toy_data_expanded.csv -m Value -g Control -s 4 --num_strata 2 --num_workers 2
+        - python3 match.py ToySets/toy_data_expanded.csv -m Value -g "Control;Paradigm1" -s 2 --index_column Name --solution_path previous/solution.json
+        - python3 match.py ToySets/toy_data_expanded.csv -m Value -g "Control;Paradigm1" -s 2 --index_column Name -p results/ --rematch previous/solution.json
     """
 
     parser = argparse.ArgumentParser(add_help=False)
@@ -122,6 +424,25 @@ if __name__ == "__main__":
         f"Allowed options are {str(allowed_local_heuristic_names)}. " +
         f"Defaults to '{str(allowed_local_heuristic_names[0])}'. ")
 
+    allowed_slot_ordering_names = list(
+        local_heuristics.ALLOWED_SLOT_ORDERING_NAMES.keys())
+    optional.add_argument(
+        "--slot_ordering_name",
+        type=str,
+        default=allowed_slot_ordering_names[0],
+        help="The name of the order in which the local heuristic " +
+        "fills the slots. " +
+        f"Allowed options are {str(allowed_slot_ordering_names)}. " +
+        f"Defaults to '{str(allowed_slot_ordering_names[0])}'. ")
+    optional.add_argument("--num_threads",
+                          type=int,
+                          default=1,
+                          help="The number of threads scoring the candidates " +
+                          "of large groups (from " +
+                          f"{local_heuristics.MIN_CHUNK_SIZE} candidates " +
+                          "per thread), for the nearest heuristics. " +
+                          "Defaults to 1. ")
+
     optional.add_argument(
         "-b",
         "--global_heuristic_name",
@@ -132,12 +453,44 @@ if __name__ == "__main__":
         f"Defaults to '{str(allowed_global_heuristic_names[0])}'. ")
 
 
+    allowed_metric_names = list(metrics.ALLOWED_METRIC_NAMES.keys())
+    optional.add_argument(
+        "--metric_name",
+        type=str,
+        default=allowed_metric_names[0],
+        help="The name of the metric to match with. " +
+        f"Allowed options are {str(allowed_metric_names)}. " +
+        f"Defaults to '{str(allowed_metric_names[0])}'. ")
+    optional.add_argument("--weights",
+                          type=str,
+                          default=None,
+                          help="The weights of the variables to match, " +
+                          "in the same order. Separate with ';'. " +
+                          "Defaults to equal weights. ")
+
+    allowed_objective_names = list(objectives.ALLOWED_OBJECTIVE_NAMES.keys())
+    optional.add_argument(
+        "--objective_name",
+        type=str,
+        default=allowed_objective_names[0],
+        help="The name of the objective to minimize. " +
+        f"Allowed options are {str(allowed_objective_names)}. " +
+        f"Defaults to '{str(allowed_objective_names[0])}'. ")
+
     optional.add_argument("-d",
                           "--delimiter",
                           type=str,
                           default=";",
                           help="The delimiter for the .csv data file. " +
                           "Defaults to ';'.")
+    optional.add_argument("--index_column",
+                          type=str,
+                          default=None,
+                          help="A column identifying the elements, " +
+                          "used as their index in the subgroup files " +
+                          "and solution files. Needed to re-match " +
+                          "a dataset whose rows were edited. " +
+                          "Defaults to the row numbers. ")
     optional.add_argument("-p",
                           "--save_path",
                           type=str,
@@ -145,28 +498,198 @@ if __name__ == "__main__":
                           help="The path to where to save the results, " +
                           "from the current folder. " +
                           "Defaults to current folder. ")
+    optional.add_argument("--checkpoint_path",
+                          type=str,
+                          default=None,
+                          help="A file to periodically save the state " +
+                          "of the search to. " +
+                          "Defaults to no checkpoint. ")
+    optional.add_argument("--checkpoint_interval",
+                          type=float,
+                          default=5.,
+                          help="The minimal time between two checkpoints, " +
+                          "in seconds. Defaults to 5. ")
+    optional.add_argument("--resume",
+                          action="store_true",
+                          help="Resume the search from the checkpoint file " +
+                          "if it exists. ")
+    allowed_stopping_criterion_names = list(
+        equivalence_tests.ALLOWED_STOPPING_CRITERION_NAMES.keys())
+    optional.add_argument(
+        "--stopping_criterion_name",
+        type=str,
+        default=None,
+        help="The name of the criterion to stop the search " +
+        "at the first solution meeting it. " +
+        f"Allowed options are {str(allowed_stopping_criterion_names)}. " +
+        "Requires --stopping_threshold. " +
+        "Defaults to no stopping criterion. ")
+    optional.add_argument("--stopping_threshold",
+                          type=float,
+                          default=None,
+                          help="The threshold of the stopping criterion. ")
+    optional.add_argument("--time_limit",
+                          type=float,
+                          default=None,
+                          help="The maximal search time, in seconds. " +
+                          "Defaults to no limit. ")
+    optional.add_argument("--max_memory",
+                          type=float,
+                          default=None,
+                          help="The approximate memory budget of the search, " +
+                          "in megabytes. Once reached, explored nodes are " +
+                          "forgotten, and the search stops if its current " +
+                          "path alone exceeds the budget. Defaults to no budget. ")
+    optional.add_argument("--measure_memory",
+                          action="store_true",
+                          help="Print the growth of the approximate memory " +
+                          "held by the search, along with that of the memory " +
+                          "traced by tracemalloc. ")
+    optional.add_argument("--binary_cache",
+                          action="store_true",
+                          help="Load the data file from a memory-mapped " +
+                          "binary cache, built on first use and rebuilt " +
+                          "whenever the data file changes. ")
+    optional.add_argument("--cache_directory",
+                          type=str,
+                          default=None,
+                          help="The directory to store binary caches in. " +
+                          "Defaults to next to the data file. ")
+    optional.add_argument("--num_solutions",
+                          type=int,
+                          default=1,
+                          help="The number of best distinct solutions " +
+                          "to save. Defaults to 1. ")
+    optional.add_argument("--min_difference",
+                          type=int,
+                          default=1,
+                          help="The minimal number of elements by which " +
+                          "saved solutions differ. Defaults to 1. ")
+    optional.add_argument(
+        "--solver_name",
+        type=str,
+        default=ALLOWED_SOLVER_NAMES[0],
+        help="The name of the solver to use. " +
+        f"Allowed options are {str(ALLOWED_SOLVER_NAMES)}. " +
+        f"Defaults to '{ALLOWED_SOLVER_NAMES[0]}'. ")
+    optional.add_argument("--max_iterations",
+                          type=int,
+                          default=10000,
+                          help="The maximal number of search iterations " +
+                          "(or annealing moves). Defaults to 10000. ")
+    optional.add_argument("--seed",
+                          type=int,
+                          default=None,
+                          help="The seed of the annealing solver. " +
+                          "Defaults to unseeded. ")
+    allowed_temperature_schedule_names = list(
+        annealing.ALLOWED_TEMPERATURE_SCHEDULE_NAMES.keys())
+    optional.add_argument(
+        "--temperature_schedule_name",
+        type=str,
+        default=allowed_temperature_schedule_names[0],
+        help="The temperature schedule of the annealing solver. " +
+        f"Allowed options are {str(allowed_temperature_schedule_names)}. " +
+        f"Defaults to '{allowed_temperature_schedule_names[0]}'. ")
+    optional.add_argument("--num_strata",
+                          type=int,
+                          default=None,
+                          help="The number of strata to decompose " +
+                          "the problem into, for very large groups. " +
+                          "Strata are solved by annealing in parallel, " +
+                          "then merged. Defaults to no decomposition. ")
+    optional.add_argument("--num_workers",
+                          type=int,
+                          default=None,
+                          help="The number of worker processes " +
+                          "solving the strata. " +
+                          "Defaults to one per processor. ")
+    optional.add_argument("--solution_path",
+                          type=str,
+                          default=None,
+                          help="A file to write the best solutions to, " +
+                          "as JSON, to re-match from later (see --rematch). " +
+                          "Defaults to no file. ")
+    optional.add_argument("--rematch",
+                          type=str,
+                          default=None,
+                          help="A solution file (see --solution_path) " +
+                          "from an earlier run on a previous version " +
+                          "of the data. Its elements still in the data " +
+                          "are kept, and only the other slots are searched. ")
     args = parser.parse_args()
+    if (args.stopping_criterion_name is not None
+            and args.stopping_threshold is None):
+        parser.error("--stopping_criterion_name requires --stopping_threshold.")
+    if args.stopping_criterion_name == "min_p_value" and args.subset_size < 2:
+        parser.error("--stopping_criterion_name min_p_value requires " +
+                     "--subset_size of at least 2.")
 
-    df = pd.read_csv(args.DATAFILE, sep=args.delimiter)
     variables_to_match = args.match.split(";")
     grouping_factors = args.group.split(";")
+    if args.binary_cache:
+        args.DATAFILE.close()
+        df = binary_cache.load_dataframe(args.DATAFILE.name,
+                                         args.delimiter,
+                                         args.cache_directory,
+                                         variables_to_match + grouping_factors
+                                         + ([] if args.index_column is None
+                                            else [args.index_column]))
+    else:
+        df = pd.read_csv(args.DATAFILE, sep=args.delimiter)
+    if args.index_column is not None:
+        df = df.set_index(args.index_column)
 
     subsets_size = args.subset_size
+    weights = (None if args.weights is None
+               else [float(weight) for weight in args.weights.split(";")])
 
     local_heuristic = local_heuristics.get_local_heuristic_by_name(
-        args.local_heuristic_name)
+        args.local_heuristic_name, args.slot_ordering_name, args.num_threads)
 
     global_heuristic = global_heuristics.get_global_heuristic_by_name(
         args.global_heuristic_name, local_heuristic)
 
 
-    df = preprocessing.drop_non_relevant_columns(df,  variables_to_match+grouping_factors)
-    grouped_dataframe = split_by_labels(df, grouping_factors)
-    subgrouped_dataframe = find_matched_subgroups(grouped_dataframe,
-                                                    variables_to_match,
-                                                    local_heuristic,
-                                                    global_heuristic,
-                                                    subsets_size)
+    grouped_dataframe = prepare_grouped_dataframe(df,
+                                                  variables_to_match,
+                                                  grouping_factors)
+    try:
+        solution_dataframes = find_matched_subgroups(grouped_dataframe,
+                                                        variables_to_match,
+                                                        local_heuristic,
+                                                        global_heuristic,
+                                                        subsets_size,
+                                                        args.metric_name,
+                                                        weights,
+                                                        args.objective_name,
+                                                        args.checkpoint_path,
+                                                        args.checkpoint_interval,
+                                                        args.resume,
+                                                        args.stopping_criterion_name,
+                                                        args.stopping_threshold,
+                                                        max_iterations=args.max_iterations,
+                                                        time_limit=args.time_limit,
+                                                        max_memory=(None if args.max_memory is None
+                                                                    else int(args.max_memory * 2**20)),
+                                                        measure_memory=args.measure_memory,
+                                                        num_solutions=(args.num_solutions
+                                                            if args.num_solutions > 1 else None),
+                                                        min_difference=args.min_difference,
+                                                        solver_name=args.solver_name,
+                                                        seed=args.seed,
+                                                        temperature_schedule_name=args.temperature_schedule_name,
+                                                        num_strata=args.num_strata,
+                                                        num_workers=args.num_workers,
+                                                        solution_path=args.solution_path,
+                                                        previous_solution_path=args.rematch)
+    except ValueError as error:
+        parser.exit(1, f"ERROR: {error}\n")
+    if args.num_solutions <= 1:
+        solution_dataframes = [solution_dataframes]
 
-    for i, subgroup_dataframe in enumerate(subgrouped_dataframe):
-        pd.DataFrame(subgroup_dataframe).to_csv(op.join(args.save_path, f'subgroup_{i + 1:02d}.csv'))
+    for k, solution_dataframe in enumerate(solution_dataframes):
+        solution_prefix = f'solution_{k + 1:02d}_' if args.num_solutions > 1 else ''
+        for i, (_, subgroup_dataframe) in enumerate(solution_dataframe):
+            subgroup_dataframe.to_csv(op.join(args.save_path,
+                f'{solution_prefix}subgroup_{i + 1:02d}.csv'))
@@ -5,161 +5,162 @@ Author: Maxime Cauté
 Created: 07.04.2021
 
 This file is dedicated to the implementation of metrics for solutions.
+Metrics on compiled feature matrices are defined by a transform,
+applied once to the matched values, after which every distance
+is a plain squared euclidian distance.
+Defined transforms should be added to the ALLOWED_METRIC_NAMES dictionnary with their name.
 """
 import numpy as np
-import itertools
 
 
-EUCLIDIAN_DISTANCE = lambda a,b : np.linalg.norm(a-b)
+########### Metric transforms
 
-def remove_wrong_indices_in_tuple(tuple):
+def validate_weights(weights, num_columns):
     """
-    Removes invalid indices (e.g. -1) in a tuple.
+    Ensures the column weights are valid, and returns them as an array.
+    Missing weights default to 1 for every column.
     --
     Input:
-        - tuple: int list dict. The tuple to remove indices from.
+        - weights: float list or None. The weights to validate.
+        - num_columns: int. The number of matched columns.
     Output:
-        - cleaned_tuple: int list dict. The tuple with invalid indices removed.
+        - weights: float array. The validated weights.
     """
-    return {group_id: index for group_id, index in tuple.items() if index!=-1}
+    if weights is None:
+        return np.ones(num_columns)
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != (num_columns,):
+        raise ValueError(f"Expected {num_columns} weights, "
+                         f"got an array of shape {weights.shape}!")
+    if np.any(weights < 0):
+        raise ValueError(f"Weights should be non-negative, got {weights}!")
+    return weights
 
-def remove_wrong_indices_in_tuple_pair(tuple1, tuple2):
+def transform_for_euclidian(values, weights):
     """
-    Removes invalid indices (e.g. -1) in a tuple pair.
-    If an index is invalid in a tuple, it is removed in the second tuple as well.
+    Centers the values and scales each column by the square root of its weight.
     --
     Input:
-        - tuple1: int list dict. The first tuple to remove indices from.
-        - tuple2: int list dict. The second tuple to remove indices from.
+        - values: float array. The values to transform, one row per element.
+        - weights: float array. The weight of each column.
     Output:
-        - cleaned_tuple1: int list dict.
-            The first tuple with invalid indices removed.
-        - cleaned_tuple2: int list dict.
-            The first tuple with invalid indices removed.
+        - transformed_values: float array. The transformed values.
     """
-    valid_indices = []
-    for i, element in enumerate(tuple1):
-        if element != -1 and tuple2[i] != -1:
-            valid_indices.append(i)
-    return [tuple1[i] for i in valid_indices], [tuple2[i] for i in valid_indices]
+    return (values - values.mean(axis=0)) * np.sqrt(weights)
 
+def transform_for_standardized_euclidian(values, weights):
+    """
+    Centers the values and divides each column by its standard deviation,
+    before scaling it by the square root of its weight.
+    Constant columns are left unscaled.
+    --
+    Input:
+        - values: float array. The values to transform, one row per element.
+        - weights: float array. The weight of each column.
+    Output:
+        - transformed_values: float array. The transformed values.
+    """
+    standard_deviations = values.std(axis=0)
+    standard_deviations[standard_deviations == 0] = 1
+    return transform_for_euclidian(values / standard_deviations, weights)
 
-def compute_distance_from_tuples_and_group_indices(
-                tuple1, tuple2,
-                group1_id,group2_id,
-                groups_dataframe,
-                distance_metric = EUCLIDIAN_DISTANCE,
-                distance_modifier = lambda x: x,
-
-    ):
+def transform_for_mahalanobis(values, weights, tolerance = 1e-10):
     """
-    Computes a distance between two elements,
-    taken from given respective tuple and groups, over values from a dataframe.
+    Centers and whitens the values by the inverse square root
+    of their covariance matrix, before scaling each column
+    by the square root of its weight.
+    The symmetric (ZCA) whitening is used,
+    so that each whitened column stays as close as possible to its original one.
+    Directions of (nearly) null variance are dropped.
     --
     Input:
-        - tuple1: int list dict. The tuple of the first element.
-        - tuple2: int list dict. The tuple of the second element.
-        - group1_id: string. The id of the group of the first element.
-        - group2_id: string. The id of the group of the second element.
-        - groups_dataframe: pd.DataFrameGroupBy. The dataframe grouped by groups.
+        - values: float array. The values to transform, one row per element.
+        - weights: float array. The weight of each column.
     Parameters:
-        - distance_metric: int array-like -> int array-like.
-            The metric to compute distance with.
-            Defaults to euclidian distance.
-        - distance_modifier: int -> int. A modifier to apply to distances.
-            Defaults to identity.
+        - tolerance: float. The relative threshold under which
+            a variance is considered null. Defaults to 1e-10.
     Output:
-        - modified_elements_distance: int.
-            The (modified) distance computed between the elements.
+        - transformed_values: float array. The transformed values.
     """
-    element1_index = tuple1[group1_id]
-    element2_index = tuple2[group2_id]
-
-    group1_dataframe = groups_dataframe.get_group(group1_id)
-    group2_dataframe = groups_dataframe.get_group(group2_id)
+    centered_values = values - values.mean(axis=0)
+    if values.shape[0] < 2:
+        return centered_values * np.sqrt(weights)
+    covariance = np.atleast_2d(np.cov(centered_values, rowvar=False))
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    kept = eigenvalues > tolerance * max(eigenvalues.max(), 0)
+    inverse_square_roots = np.zeros_like(eigenvalues)
+    inverse_square_roots[kept] = 1 / np.sqrt(eigenvalues[kept])
+    whitening = (eigenvectors * inverse_square_roots) @ eigenvectors.T
+    return (centered_values @ whitening) * np.sqrt(weights)
 
-    #The first element of .values is the index
-    element1_values = group1_dataframe.loc[element1_index].values[1:]
-    element2_values = group2_dataframe.loc[element2_index].values[1:]
+ALLOWED_METRIC_NAMES = {
+    'euclidian': transform_for_euclidian,
+    'standardized': transform_for_standardized_euclidian,
+    'mahalanobis': transform_for_mahalanobis
+}
+# Metrics whose transform is fitted on the values beyond centering:
+# their distances are only comparable between computations on the same data.
+DATA_DEPENDENT_METRIC_NAMES = ['standardized', 'mahalanobis']
 
-    elements_distance = distance_metric(element1_values, element2_values)
-    return distance_modifier(elements_distance)
-
-def compute_distance_between_subgroups( element_indices_by_subgroup_per_tuple,
-                                        groups_dataframe,
-                                        distance_metric = EUCLIDIAN_DISTANCE,
-                                        distance_modifier = lambda x: x**2
-    ):
+def get_metric_transform_by_name(metric_name):
     """
-    Computes the distance between the elements of two subgroups of a dataframe.
+    This function retrieves a given metric transform by its name.
+    If the name is not valid, returns "euclidian" transform,
+    and raises a warning.
     --
     Input:
-        - elements_indices_by_subgroup_per_tuple: int dict list.
-            The list of tuples for chosen element by subgroup,
-            to compute distance from for a given subgroup
-                Such a tuple is a dictionnary of groups associated (by id)
-                with one of their element.
-        - groups_dataframe: pd.DataFrameGroupBy. The grouped dataframe.
-    Parameters:
-        - distance_metric: int array-like -> int array-like.
-            The metric to compute distance with.
-            Defaults to euclidian distance.
-        - distance_modifier: int -> int. A modifier to apply to distances.
-            Defaults to square.
+        - metric_name: string. The name of the metric.
+            Current possible options are:
+                + euclidian
+                + standardized
+                + mahalanobis
     Outputs:
-        - distance: int. The distance between the subgroups
+        - metric_transform: float array, float array -> float array.
+            The chosen metric transform.
+            Is "euclidian" transform by default for invalid names.
     """
-    subgroups_size = len(element_indices_by_subgroup_per_tuple)
-    num_groups = len(element_indices_by_subgroup_per_tuple[0])
-    distance = 0
+    if metric_name in ALLOWED_METRIC_NAMES:
+        return ALLOWED_METRIC_NAMES[metric_name]
+    default_metric_name = list(ALLOWED_METRIC_NAMES.keys())[0]
+    print(  f"WARNING: invalid name - {metric_name}!\n"+
+            f"Resolving to default metric '{default_metric_name}'.")
+    return ALLOWED_METRIC_NAMES[default_metric_name]
 
-    groups_ids = groups_dataframe.indices.keys()
-    for group1_id, group2_id in itertools.combinations(groups_ids, 2):
-        for tuple1, tuple2 in itertools.combinations_with_replacement(element_indices_by_subgroup_per_tuple,2):
-            #Can move modifier into distance
-            distance+= compute_distance_from_tuples_and_group_indices(
-                tuple1, tuple2,
-                group1_id, group2_id,
-                groups_dataframe,
-                distance_metric = distance_metric,
-                distance_modifier = distance_modifier
-            )
-    return distance
+########### Distances on compiled feature matrices
 
-def compute_distance_within_tuple(  element_indices_by_subgroup__tuple,
-                                    groups_dataframe,
-                                    distance_metric = EUCLIDIAN_DISTANCE,
-                                    distance_modifier = lambda x : x**2):
+def compute_squared_distance_within_values(values):
     """
-    Computes the distance within all the valid the elements of a tuple
-    in a dataframe.
+    Computes the sum of the squared euclidian distances
+    between every pair of rows of an array.
     --
     Input:
-        - elements_indices_by_subgroup_per_tuple: int dict list.
-            The list of tuples for chosen element by subgroup,
-            to compute distance from for a given subgroup
-                Such a tuple is a dictionnary of groups associated (by id)
-                with one of their element.
-        - groups_dataframe: pd.DataFrameGroupBy. The grouped dataframe.
-    Parameters:
-        - distance_metric: int array-like -> int array-like.
-            The metric to compute distance with.
-            Defaults to euclidian distance.
-        - distance_modifier: int -> int. A modifier to apply to distances.
-            Defaults to square.
-    Outputs:
-        - distance: int. The distance between the subgroups
+        - values: float array. The values, one row per element.
+    Output:
+        - distance: float. The summed squared distances.
     """
-    tuple =  remove_wrong_indices_in_tuple(element_indices_by_subgroup__tuple)
-    group_ids = list(tuple.keys())
-    distance = 0
+    num_values = values.shape[0]
+    if num_values < 2:
+        return 0.
+    distance = (num_values * np.sum(values**2)
+                - np.sum(np.sum(values, axis=0)**2))
+    return max(distance, 0.)
 
-    for group1_index, group2_index in itertools.combinations(group_ids, 2):
-        distance+= compute_distance_from_tuples_and_group_indices(
-            tuple, tuple,
-            group1_index, group2_index,
-            groups_dataframe,
-            distance_metric = distance_metric,
-            distance_modifier = distance_modifier
-        )
-    return distance
+def compute_squared_distances_to_tuple(candidate_values, tuple_values):
+    """
+    Computes, for each candidate, the squared euclidian distance
+    within a tuple once the candidate is added to it.
+    --
+    Input:
+        - candidate_values: float array. The values of the candidates,
+            one row per candidate.
+        - tuple_values: float array. The values of the tuple elements,
+            one row per element.
+    Output:
+        - distances: float array. The distance for each candidate.
+    """
+    num_tuple_values = tuple_values.shape[0]
+    tuple_sums = np.sum(tuple_values, axis=0)
+    distances = (num_tuple_values * np.sum(candidate_values**2, axis=1)
+                 - 2 * candidate_values @ tuple_sums
+                 + np.sum(tuple_values**2))
+    return compute_squared_distance_within_values(tuple_values) + distances
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created: 19.10.2026
+
+This file is dedicated to the implementation and selection of objectives.
+Objectives compute the distance of a (partial) solution from running
+per-group statistics (counts, sums and sums of squares of the values
+of a compiled feature matrix), which are updated in O(columns)
+whenever an element is added to or removed from a subgroup.
+Scoring a decision thus never depends on the size of the subgroups.
+Objectives also provide a lower bound of the distance of any solution
+completing a partial one, used to prune the search.
+Defined objectives should be added to the ALLOWED_OBJECTIVE_NAMES dictionnary with their name.
+"""
+import numpy as np
+
+
+class GroupStatistics():
+    """
+    Running counts, sums and sums of squares of the values of each group.
+    """
+
+    def __init__(self, num_groups, num_columns):
+        self.counts = np.zeros(num_groups)
+        self.sums = np.zeros((num_groups, num_columns))
+        self.squares = np.zeros((num_groups, num_columns))
+
+    def copy(self):
+        """
+        Creates a (deep) copy of the statistics.
+        """
+        copy_statistics = GroupStatistics(0, 0)
+        copy_statistics.counts = self.counts.copy()
+        copy_statistics.sums = self.sums.copy()
+        copy_statistics.squares = self.squares.copy()
+        return copy_statistics
+
+    def add(self, group_position, values):
+        """
+        Adds the values of an element to a group.
+        """
+        self.counts[group_position] += 1
+        self.sums[group_position] += values
+        self.squares[group_position] += values**2
+
+    def remove(self, group_position, values):
+        """
+        Removes the values of an element from a group.
+        """
+        self.counts[group_position] -= 1
+        self.sums[group_position] -= values
+        self.squares[group_position] -= values**2
+
+    def get_means(self):
+        """
+        Returns the mean values of each group (0 for empty groups).
+        """
+        return self.sums / np.maximum(self.counts, 1)[:, None]
+
+    def get_variances(self):
+        """
+        Returns the (population) variances of each group (0 for empty groups).
+        """
+        means = self.get_means()
+        variances = self.squares / np.maximum(self.counts, 1)[:, None] - means**2
+        return np.maximum(variances, 0)
+
+
+def compute_pairwise_spread(vectors, candidate_vectors = None):
+    """
+    Computes the summed squared distances between every pair of vectors.
+    If candidate vectors are given, this is computed for each candidate,
+    once it is added to the vectors.
+    --
+    Input:
+        - vectors: float array. The vectors, one per row.
+    Parameters:
+        - candidate_vectors: float array. The candidates, one per row.
+            Defaults to None (no candidates).
+    Output:
+        - spread: float or float array. The spread (for each candidate).
+    """
+    num_vectors = vectors.shape[0]
+    vectors_sum = np.sum(vectors, axis=0)
+    squares_sum = np.sum(vectors**2)
+    if candidate_vectors is None:
+        return max(num_vectors * squares_sum - np.sum(vectors_sum**2), 0.)
+    return ((num_vectors + 1) * (squares_sum + np.sum(candidate_vectors**2, axis=1))
+            - np.sum((vectors_sum + candidate_vectors)**2, axis=1))
+
+
+class PairwiseObjective():
+    """
+    Summed squared euclidian distance between every pair of elements
+    from different subgroups.
+    """
+
+    def __repr__(self):
+        return "PairwiseObjective()"
+
+    def compute_distance(self, statistics):
+        """
+        Computes the distance of a (partial) solution from its statistics.
+        """
+        squares = np.sum(statistics.squares, axis=1)
+        distance = (np.sum(squares * (np.sum(statistics.counts) - statistics.counts))
+                    - np.sum(np.sum(statistics.sums, axis=0)**2)
+                    + np.sum(statistics.sums**2))
+        return max(distance, 0.)
+
+    def compute_lower_bound(self, statistics):
+        """
+        Computes a lower bound of the distance of any solution
+        completing a partial one.
+        As adding elements only adds pairs, the partial distance is one.
+        """
+        return self.compute_distance(statistics)
+
+    def compute_distances_if_added(self, statistics, group_position, candidate_values):
+        """
+        Computes, for each candidate, the distance of a (partial) solution
+        once the candidate is added to a group.
+        """
+        others_count = np.sum(statistics.counts) - statistics.counts[group_position]
+        others_squares = (np.sum(statistics.squares)
+                          - np.sum(statistics.squares[group_position]))
+        others_sums = (np.sum(statistics.sums, axis=0)
+                       - statistics.sums[group_position])
+        return (self.compute_distance(statistics)
+                + others_squares
+                + others_count * np.sum(candidate_values**2, axis=1)
+                - 2 * candidate_values @ others_sums)
+
+
+class MomentObjective():
+    """
+    Summed squared distance between the means
+    (and optionally the variances) of every pair of non-empty subgroups.
+    """
+
+    def __init__(self, match_variances = False):
+        self.match_variances = match_variances
+
+    def __repr__(self):
+        return f"MomentObjective(match_variances={self.match_variances})"
+
+    def compute_distance(self, statistics):
+        """
+        Computes the distance of a (partial) solution from its statistics.
+        """
+        non_empty = statistics.counts > 0
+        distance = compute_pairwise_spread(statistics.get_means()[non_empty])
+        if self.match_variances:
+            distance += compute_pairwise_spread(statistics.get_variances()[non_empty])
+        return distance
+
+    def compute_lower_bound(self, statistics):
+        """
+        Computes a lower bound of the distance of any solution
+        completing a partial one.
+        Moments can still get closer when elements are added, so it is 0.
+        """
+        return 0.
+
+    def compute_distances_if_added(self, statistics, group_position, candidate_values):
+        """
+        Computes, for each candidate, the distance of a (partial) solution
+        once the candidate is added to a group.
+        """
+        others = statistics.counts > 0
+        others[group_position] = False
+        count = statistics.counts[group_position] + 1
+        candidate_means = (statistics.sums[group_position] + candidate_values) / count
+        distances = compute_pairwise_spread(statistics.get_means()[others],
+                                            candidate_means)
+        if self.match_variances:
+            candidate_variances = np.maximum(
+                (statistics.squares[group_position] + candidate_values**2) / count
+                - candidate_means**2, 0)
+            distances += compute_pairwise_spread(statistics.get_variances()[others],
+                                                 candidate_variances)
+        return distances
+
+
+ALLOWED_OBJECTIVE_NAMES = {
+    'pairwise': PairwiseObjective(),
+    'means': MomentObjective(),
+    'means_and_variances': MomentObjective(match_variances = True)
+}
+
+def get_objective_by_name(objective_name):
+    """
+    This function retrieves a given objective by its name.
+    If the name is not valid, returns "pairwise" objective,
+    and raises a warning.
+    --
+    Input:
+        - objective_name: string. The name of the objective.
+            Current possible options are:
+                + pairwise
+                + means
+                + means_and_variances
+    Outputs:
+        - objective: objective. The chosen objective.
+            Is "pairwise" objective by default for invalid names.
+    """
+    if objective_name in ALLOWED_OBJECTIVE_NAMES:
+        return ALLOWED_OBJECTIVE_NAMES[objective_name]
+    default_objective_name = list(ALLOWED_OBJECTIVE_NAMES.keys())[0]
+    print(  f"WARNING: invalid name - {objective_name}!\n"+
+            f"Resolving to default objective '{default_objective_name}'.")
+    return ALLOWED_OBJECTIVE_NAMES[default_objective_name]
@@ -5,8 +5,10 @@ Author: Maxime Cauté
 Created: 05.05.2021
 
 This file is dedicated to data preprocessing, for use in EquiTables.
+It holds the adapters from dataframes to the NumPy arrays the search works on.
 """
 import numpy as np
+from feature_matrix import FeatureMatrix
 global EQUITABLES_GROUP_INDEX
 EQUITABLES_GROUP_INDEX = 0
 EQUITABLES_BASE_GROUPNAME = "EquiTablesGroup"
@@ -124,3 +126,49 @@ def drop_custom_groups(dataframe, custom_groups_names = []):
         if (column_name in custom_groups_names) or column_name.startswith(EQUITABLES_BASE_GROUPNAME):
             dataframe = dataframe.drop(column_name,axis = 1)
     return dataframe
+
+def compile_feature_matrix(grouped_dataframe,
+                           columns_to_match = None,
+                           metric_name = "euclidian",
+                           weights = None):
+    """
+    Compiles the feature matrix of a grouped dataframe.
+    Raises a ValueError if two elements of a group share an index.
+    --
+    Input:
+        - grouped_dataframe: pd.DataFrameGroupBy. The grouped dataframe.
+    Parameters:
+        - columns_to_match: string list. The columns to match on.
+            Defaults to None (all columns).
+        - metric_name: string. The name of the metric to transform with.
+            Defaults to "euclidian".
+        - weights: float list. The weight of each matched column.
+            Defaults to None (equal weights).
+    Output:
+        - feature_matrix: FeatureMatrix. The compiled feature matrix.
+    """
+    values_per_group = []
+    rows_by_group = {}
+    num_rows = 0
+    for group_id in grouped_dataframe.indices.keys():
+        group_dataframe = grouped_dataframe.get_group(group_id)
+        if columns_to_match is None:
+            columns_to_match = list(group_dataframe.columns)
+        values_per_group.append(
+            group_dataframe[columns_to_match].to_numpy(dtype=float)
+        )
+        rows_by_group[group_id] = {
+            element_index: num_rows + position
+            for position, element_index in enumerate(group_dataframe.index)
+        }
+        if len(rows_by_group[group_id]) < len(group_dataframe):
+            duplicate_index = group_dataframe.index[group_dataframe.index.duplicated()][0]
+            raise ValueError(f"Duplicate element index {duplicate_index} "
+                             f"in group {group_id}!")
+        num_rows += len(group_dataframe)
+
+    return FeatureMatrix(np.concatenate(values_per_group),
+                         rows_by_group,
+                         columns_to_match,
+                         metric_name = metric_name,
+                         weights = weights)
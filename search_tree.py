@@ -6,30 +6,32 @@ Created: 17.03.2021
 
 
 This file is dedicated to implementation of search trees.
+Searches only work on a compiled feature matrix (see EquiTables.feature_matrix),
+and solutions are arrays of its rows:
+converting them back to dataframes is left to the callers
+(see EquiTables.match).
 """
+import sys
+import time
+import heapq
+import tracemalloc
 import numpy as np
-import metrics
-import copy
+import checkpoints
+import objectives
 
-ROOT_ID = "root"
+# Id of the root of a search tree; nodes created without an id (None) are not roots.
+ROOT_ID = 0
+# Approximate size of an explored decision (a tuple of three integers).
+DECISION_MEMORY_SIZE = sys.getsizeof((0, 0, 0)) + 3 * sys.getsizeof(2**16)
 
-def get_elements_indices_by_group_in_dataframe(grouped_dataframe):
+def get_solution_items(solution):
     """
-    Retrieves the sets of indices for each group
-    in a grouped dataframe
+    Returns the set of rows selected in a solution,
+    regardless of the tuples they are in.
+    Solutions are arrays of the row chosen for each tuple (line)
+    and group (column).
     """
-    if grouped_dataframe is None:
-        return {}
-    dataframe_and_id_per_group= [
-        (group_id,grouped_dataframe.get_group(group_id)) for group_id
-                                             in grouped_dataframe.indices.keys()
-    ]
-    indices_sets_by_group = {
-        group_id:set(dataframe.index)   for group_id,dataframe
-                                        in dataframe_and_id_per_group
-    }
-    return indices_sets_by_group
-
+    return frozenset(np.ravel(solution).tolist())
 
 class SearchTree():
     """
@@ -37,13 +39,31 @@ class SearchTree():
     """
     ########### Constructors and representation
 
-    def __init__(self, groups_dataframe, subgroups_size):
+    def __init__(self, feature_matrix, subgroups_size, objective = None,
+                 num_solutions = 1, min_difference = 1):
+        if objective is None:
+            objective = objectives.PairwiseObjective()
         self.num_nodes = 1
-        self.root = PossibleSubgroupsNode(groups_dataframe, subgroups_size, id = ROOT_ID)
+        self.num_iterations = 0
+        self.root = PossibleSubgroupsNode(feature_matrix, subgroups_size,
+                                          objective = objective,
+                                          id = ROOT_ID)
         self.mothers_by_nodes = {}
         self.current_node = self.root
-        self.base_dataframe = groups_dataframe
 
+        self.num_solutions = num_solutions
+        self.min_difference = max(min_difference, 1)
+        self.best_solutions = []
+        self.num_recorded_solutions = 0
+        # Distance a solution has to beat before any is found,
+        # e.g. that of a previous solution when re-matching.
+        self.initial_bound = np.inf
+        # Approximate memory held by the search, only tracked under a budget.
+        self.memory_size_by_node = None
+        self.solutions_memory_size = 0
+        self.memory_size = 0
+        self.memory_measurement = None
+        self.exceeded_memory_budget = False
 
     def __str__(self):
         return (f"Root: {repr(self.root)}\n"
@@ -56,32 +76,70 @@ class SearchTree():
         """
         self.mothers_by_nodes[new_node] = source_node
         self.num_nodes+=1
+        self.update_node_memory_size(new_node)
+
+    def fix_elements(self, element_indices_by_group):
+        """
+        Fixes elements in the subgroups of the root, before any search,
+        which then only fills the remaining slots.
+        Groups and elements that are not in the data are ignored,
+        as well as elements beyond the size of the subgroups.
+        --
+        Input:
+            - element_indices_by_group: list dict.
+                The indices of the elements to fix, by group id.
+        Output:
+            - num_fixed_elements: int. The number of fixed elements.
+        """
+        feature_matrix = self.root.feature_matrix
+        num_fixed_elements = 0
+        for group_id, element_indices in element_indices_by_group.items():
+            if group_id not in feature_matrix.group_positions:
+                continue
+            group_position = feature_matrix.group_positions[group_id]
+            rows_by_element = feature_matrix.rows_by_group[group_id]
+            rows = [rows_by_element[element_index] for element_index in element_indices
+                    if element_index in rows_by_element]
+            for tuple_index, row in enumerate(rows[:self.root.subgroups_size]):
+                self.root.fill_slot((tuple_index, group_position, row))
+                num_fixed_elements += 1
+        if self.root.is_leaf():
+            self.record_solution(self.root.internal_distance, self.root.solution)
+        return num_fixed_elements
 
     ########## Search functions
 
     def make_decision_from_current_node(self, decision):
         """
         Creates a new node based on the decision of an element
+        (a tuple index, a group id or index and an element index)
+        from the current node, and moves to this new node.
+        """
+        self.apply_decision(self.current_node.validate_decision(decision))
+
+    def apply_decision(self, decision):
+        """
+        Creates a new node based on an internal decision
+        (a tuple index, a group position and a row), without checking it,
         from the current node, and moves to this new node.
         """
         new_node = self.current_node.create_new_node_from_decision(
                 decision,
-                self.base_dataframe,
                 new_node_id = self.num_nodes
         )
         self.add_node(new_node, self.current_node)
         self.current_node = new_node
+        if new_node.is_leaf():
+            self.record_solution(new_node.internal_distance, new_node.solution)
 
     def step_forward(self, local_heuristic):
         """
         Moves down to a new node according to a local heuristic
         """
-        chosen_element_index, group_id, tuple_index, _ = local_heuristic(
+        chosen_row, group_position, tuple_index, _ = local_heuristic(
                 self.current_node
         )
-        self.make_decision_from_current_node(
-            (tuple_index, group_id, chosen_element_index)
-        )
+        self.apply_decision((tuple_index, group_position, chosen_row))
 
     def backtrack(self):
         """
@@ -95,6 +153,8 @@ class SearchTree():
             self.current_node.internal_distance = origin_node.internal_distance
             self.current_node.solution = origin_node.solution
         self.current_node.discard_decision(origin_node.indices_decision)
+        self.current_node.explored_decisions.append(origin_node.indices_decision)
+        self.update_node_memory_size(self.current_node)
 
     def backtrack_to_root(self):
         """
@@ -112,7 +172,9 @@ class SearchTree():
         Returns whether the step was successful (going deeper) or not.
         """
         is_at_root = self.current_node.is_root()
-        is_at_end_of_branch = self.current_node.is_end_of_branch()
+        is_at_end_of_branch = (self.current_node.is_end_of_branch()
+                               or not self.current_node.is_feasible()
+                               or self.is_pruned(self.current_node))
 
         if not is_at_end_of_branch and global_heuristic(self.current_node):
             self.step_forward(local_heuristic)
@@ -122,6 +184,216 @@ class SearchTree():
             return True
         return False
 
+    ######### Best solutions functions
+
+    def get_pruning_bound(self):
+        """
+        Returns the distance a branch has to beat to enter the best solutions,
+        that is the worst kept distance once enough solutions were found,
+        and the initial bound before.
+        """
+        if len(self.best_solutions) < self.num_solutions:
+            return self.initial_bound
+        return -self.best_solutions[0][0]
+
+    def is_pruned(self, node):
+        """
+        Checks if no solution below a node can enter the best solutions,
+        according to the lower bound of the objective.
+        """
+        return (node.objective.compute_lower_bound(node.group_statistics)
+                >= self.get_pruning_bound())
+
+    def record_solution(self, distance, solution):
+        """
+        Adds a solution to the (bounded) heap of best distinct solutions.
+        Two solutions are in conflict when fewer than min_difference
+        of the elements of one are missing from the other,
+        all groups taken together (the tuples and groups the elements
+        are in do not matter): only the best of them is kept.
+        """
+        if distance >= self.get_pruning_bound():
+            return
+        items = get_solution_items(solution)
+        kept_solutions = []
+        for kept_solution in self.best_solutions:
+            negative_distance, _, kept_items, _ = kept_solution
+            if len(items - kept_items) < self.min_difference:
+                if -negative_distance <= distance:
+                    return
+                continue
+            kept_solutions.append(kept_solution)
+
+        self.num_recorded_solutions += 1
+        kept_solutions.append(
+            (-distance, -self.num_recorded_solutions, items, solution)
+        )
+        heapq.heapify(kept_solutions)
+        while len(kept_solutions) > self.num_solutions:
+            heapq.heappop(kept_solutions)
+        self.best_solutions = kept_solutions
+        self.update_solutions_memory_size()
+
+    def get_best_solutions(self):
+        """
+        Returns the best distinct solutions found, with their distances,
+        from the best to the worst.
+        """
+        return [(-negative_distance, solution) for negative_distance, _, _, solution
+                in sorted(self.best_solutions, reverse=True)]
+
+    ######### Memory functions
+    # Nodes are retained once created, so that the tree can be inspected,
+    # but only those on the current path are needed to go on searching.
+    # Under a memory budget, the others are evicted when it is exceeded.
+
+    def start_memory_accounting(self):
+        """
+        Starts tracking the approximate memory held by the search,
+        that is by its retained nodes and best solutions.
+        """
+        self.memory_size_by_node = {}
+        self.memory_size = 0
+        for node in [self.root] + list(self.mothers_by_nodes):
+            self.update_node_memory_size(node)
+        self.update_solutions_memory_size()
+
+    def update_node_memory_size(self, node):
+        """
+        Updates the memory held by a (new or modified) node, if tracked.
+        """
+        if self.memory_size_by_node is None:
+            return
+        memory_size = node.get_memory_size(self.mothers_by_nodes.get(node))
+        self.memory_size += memory_size - self.memory_size_by_node.get(node, 0)
+        self.memory_size_by_node[node] = memory_size
+
+    def update_solutions_memory_size(self):
+        """
+        Updates the memory held by the best solutions, if tracked.
+        """
+        if self.memory_size_by_node is None:
+            return
+        solutions_memory_size = sum(solution.nbytes + sys.getsizeof(items)
+                                    for _, _, items, solution in self.best_solutions)
+        self.memory_size += solutions_memory_size - self.solutions_memory_size
+        self.solutions_memory_size = solutions_memory_size
+
+    def evict_retired_nodes(self):
+        """
+        Forgets the nodes out of the current path,
+        which are either fully explored or pruned.
+        """
+        path = self.get_current_path()
+        self.mothers_by_nodes = {node: mother_node
+                                 for mother_node, node in zip(path[:-1], path[1:])}
+        if self.memory_size_by_node is not None:
+            self.memory_size_by_node = {node: self.memory_size_by_node[node]
+                                        for node in path}
+            self.memory_size = (sum(self.memory_size_by_node.values())
+                                + self.solutions_memory_size)
+
+    def is_within_memory_budget(self, max_memory):
+        """
+        Checks if the search holds less memory than a budget (in bytes),
+        evicting the retired nodes first if it does not.
+        """
+        if self.memory_size <= max_memory:
+            return True
+        self.evict_retired_nodes()
+        return self.memory_size <= max_memory
+
+    ######### Checkpoint functions
+
+    def get_current_path(self):
+        """
+        Returns the list of nodes from the root to the current node.
+        """
+        path = [self.current_node]
+        while not path[-1].is_root():
+            path.append(self.mothers_by_nodes[path[-1]])
+        return path[::-1]
+
+    def get_checkpoint_state(self):
+        """
+        Returns a compact state of the search,
+        from which it can be resumed with restore_checkpoint_state.
+        Only the current path is kept: the nodes out of it are either
+        fully explored or not created yet.
+        """
+        path_state = [
+            (node.indices_decision, list(node.explored_decisions),
+             node.internal_distance, node.solution)
+            for node in self.get_current_path()
+        ]
+        feature_matrix = self.root.feature_matrix
+        groups_sizes = {
+            group_id: int(group_size)
+            for group_id, group_size in zip(feature_matrix.group_ids,
+                                            feature_matrix.group_sizes)
+        }
+        return {
+            "subgroups_size": self.root.subgroups_size,
+            "groups_sizes": groups_sizes,
+            "fixed_rows": self.root.chosen_rows.tolist(),
+            "objective": repr(self.root.objective),
+            "metric_name": feature_matrix.metric_name,
+            "column_names": feature_matrix.column_names,
+            "weights": feature_matrix.weights.tolist(),
+            "initial_bound": self.initial_bound,
+            "num_nodes": self.num_nodes,
+            "num_iterations": self.num_iterations,
+            "best_solutions": self.best_solutions,
+            "num_recorded_solutions": self.num_recorded_solutions,
+            "path": path_state
+        }
+
+    def restore_checkpoint_state(self, checkpoint_state):
+        """
+        Rebuilds the search path saved in a checkpoint state,
+        starting from the root of this (fresh) tree.
+        Raises a ValueError if the checkpoint was saved on other data,
+        or with another objective, metric, columns or weights,
+        whose distances cannot be compared.
+        """
+        root_state = self.get_checkpoint_state()
+        for key in ["subgroups_size", "groups_sizes", "fixed_rows", "objective",
+                    "metric_name", "column_names", "weights"]:
+            if checkpoint_state[key] != root_state[key]:
+                raise ValueError(f"Checkpoint does not match the search: "
+                                 f"{key} is {checkpoint_state[key]}, "
+                                 f"should be {root_state[key]}!")
+
+        for level, node_state in enumerate(checkpoint_state["path"]):
+            decision, explored_decisions, internal_distance, solution = node_state
+            if level > 0:
+                self.apply_decision(decision)
+            for explored_decision in explored_decisions:
+                self.current_node.discard_decision(explored_decision)
+            self.current_node.explored_decisions = list(explored_decisions)
+            self.current_node.internal_distance = internal_distance
+            self.current_node.solution = solution
+
+        self.initial_bound = checkpoint_state["initial_bound"]
+        self.num_nodes = checkpoint_state["num_nodes"]
+        self.num_iterations = checkpoint_state["num_iterations"]
+        self.best_solutions = checkpoint_state["best_solutions"]
+        self.num_recorded_solutions = checkpoint_state["num_recorded_solutions"]
+
+    def save_checkpoint(self, checkpoint_path):
+        """
+        Saves the current state of the search to a file.
+        """
+        checkpoints.save_checkpoint(self.get_checkpoint_state(), checkpoint_path)
+
+    def load_checkpoint(self, checkpoint_path):
+        """
+        Resumes the state of the search from a file.
+        """
+        self.restore_checkpoint_state(
+            checkpoints.load_checkpoint(checkpoint_path)
+        )
+
     ######### Solution retrieval functions
 
     def get_current_solution(self):
@@ -130,81 +402,234 @@ class SearchTree():
         """
         return self.current_node.solution
 
-    def get_current_subgroup_dataframe(self):
+    def get_solution_elements(self, solution):
         """
-        Returns the subgrouped dataframe associated with the current solution.
+        Returns the element indices selected in a solution, by group id.
         """
-        solution = self.get_current_solution()
-        original_indices = set(self.base_dataframe.apply(lambda x: x).index)
-        selected_indices = set(np.asarray(
-            [list(tuple.values()) for tuple in solution]).flatten())
-        dropped_indices = original_indices - selected_indices
+        if solution is None:
+            raise ValueError("No solution was found by the search!")
+        feature_matrix = self.root.feature_matrix
+        return {group_id: feature_matrix.get_elements(solution[:, group_position])
+                for group_position, group_id in enumerate(feature_matrix.group_ids)}
 
-        solution_dataframe = self.base_dataframe.apply(
-            lambda x: x.drop(dropped_indices.intersection(x.index))
-        )
-        grouping = list(solution_dataframe.index.get_level_values(0))
-        solution_dataframe.index = solution_dataframe.index.droplevel(0)
-        return solution_dataframe.groupby(grouping)
-
-    def search_and_get_solution(self,       local_heuristic = lambda x: (0,0,0),
+    def search(self,    local_heuristic = lambda x: (0,0,0),
                                             global_heuristic = lambda x: True,
-                                            max_iterations = 10000):
-        """
-        Computes a tree search and return the computed solution.
-        """
-        stop_search = False
-        for num_iterations in range(max_iterations):
-            #print(num_iterations, self.current_node)
+                                            max_iterations = 10000,
+                                            checkpoint_path = None,
+                                            checkpoint_interval = 5.,
+                                            stopping_criterion = None,
+                                            time_limit = None,
+                                            stop_event = None,
+                                            max_memory = None,
+                                            measure_memory = False):
+        """
+        Computes a tree search, and goes back to the root.
+        Branches that cannot improve the best solutions are pruned.
+        If a checkpoint path is given, the state of the search is saved there
+        every checkpoint_interval seconds, and once more when the search stops.
+        Iterations already done (e.g. in a resumed search)
+        count towards max_iterations.
+        If a stopping criterion is given (see EquiTables.equivalence_tests),
+        the search stops at the first leaf whose raw group statistics meet it,
+        and this leaf's solution becomes the current one, and the only one
+        kept in the best solutions (those found before do not meet it).
+        The search also stops after time_limit seconds,
+        or once stop_event (e.g. a threading.Event) is set,
+        keeping the best solution found so far.
+        If max_memory is given, the approximate memory held by the search
+        is kept below it (in bytes) by evicting the nodes out of the current
+        path, and the search stops if the current path alone exceeds it.
+        If measure_memory is set, the growth of this approximation
+        during the search is compared to the growth of the memory
+        traced by tracemalloc, in memory_measurement (both in bytes).
+        """
+        start_time = last_checkpoint_time = time.monotonic()
+        stopping_node = None
+        self.exceeded_memory_budget = False
+        if max_memory is not None or measure_memory:
+            self.start_memory_accounting()
+        if measure_memory:
+            was_tracing = tracemalloc.is_tracing()
+            if not was_tracing:
+                tracemalloc.start()
+            traced_start = tracemalloc.get_traced_memory()[0]
+            estimated_start = self.memory_size
+        while self.num_iterations < max_iterations:
+            if time_limit is not None and time.monotonic() - start_time >= time_limit:
+                break
+            if stop_event is not None and stop_event.is_set():
+                break
+            #print(self.num_iterations, self.current_node)
             searched_step = self.search_step_and_confirm(local_heuristic, global_heuristic)
+            self.num_iterations += 1
             if not searched_step:
                 break
-
+            if (stopping_criterion is not None and self.current_node.is_leaf()
+                    and stopping_criterion(self.current_node.raw_group_statistics)):
+                stopping_node = self.current_node
+                break
+            if max_memory is not None and not self.is_within_memory_budget(max_memory):
+                self.exceeded_memory_budget = True
+                print(f"WARNING: the search path needs {self.memory_size} bytes, "
+                      f"over the memory budget of {max_memory} bytes!\n"
+                      "Stopping the search with the best solutions found so far.")
+                break
+            if (checkpoint_path is not None and
+                    time.monotonic() - last_checkpoint_time >= checkpoint_interval):
+                self.save_checkpoint(checkpoint_path)
+                last_checkpoint_time = time.monotonic()
+
+        if measure_memory:
+            self.memory_measurement = {
+                "estimated": self.memory_size - estimated_start,
+                "traced": tracemalloc.get_traced_memory()[0] - traced_start
+            }
+            if not was_tracing:
+                tracemalloc.stop()
+        if stopping_node is not None:
+            self.num_recorded_solutions += 1
+            self.best_solutions = [(-stopping_node.internal_distance,
+                                    -self.num_recorded_solutions,
+                                    get_solution_items(stopping_node.solution),
+                                    stopping_node.solution)]
+            self.update_solutions_memory_size()
+        if checkpoint_path is not None:
+            self.save_checkpoint(checkpoint_path)
         self.backtrack_to_root()
+        if stopping_node is not None:
+            self.root.internal_distance = stopping_node.internal_distance
+            self.root.solution = stopping_node.solution
+
+    def search_and_get_solution(self, local_heuristic = lambda x: (0,0,0),
+                                      global_heuristic = lambda x: True,
+                                      **search_parameters):
+        """
+        Computes a tree search and return the computed solution.
+        Takes the same parameters as search.
+        """
+        self.search(local_heuristic, global_heuristic, **search_parameters)
+        return self.get_current_solution()
 
-        return self.get_current_subgroup_dataframe()
+    def search_and_get_solutions(self,  local_heuristic = lambda x: (0,0,0),
+                                        global_heuristic = lambda x: True,
+                                        **search_parameters):
+        """
+        Computes a tree search and return the best distinct solutions found,
+        from the best to the worst (at most num_solutions of them).
+        Takes the same parameters as search.
+        """
+        self.search(local_heuristic, global_heuristic, **search_parameters)
+        return [solution for _, solution in self.get_best_solutions()]
 
 
 class PossibleSubgroupsNode():
     """
     Nodes of the tree.
+    Internally, groups are referred to by their position
+    in the feature matrix, and elements by their row in it.
+    Candidates are not stored: those of an open slot (a tuple and group)
+    are the elements of its group that are not chosen yet,
+    minus the decisions already explored (discarded) for this very slot.
     """
+    __slots__ = ("feature_matrix", "objective", "subgroups_size",
+                 "chosen_rows", "discarded_rows_by_slot", "num_discarded_rows",
+                 "discard_counts_by_group", "num_dead_rows_by_group",
+                 "num_open_slots_by_group", "num_possible_decisions",
+                 "num_empty_open_slots", "num_deficient_groups",
+                 "group_statistics", "raw_group_statistics",
+                 "id", "internal_distance", "solution",
+                 "indices_decision", "explored_decisions")
 
     ########### Constructors and representation
 
-    def __init__(self, groups_dataframe, subgroups_size, id =""):
-        indices_sets_by_group = get_elements_indices_by_group_in_dataframe(
-            groups_dataframe
-        )
-        self.subgroups_possible_indices_tuples = [
-            copy.deepcopy(indices_sets_by_group) for i in range(subgroups_size)
-        ]
-        self.subgroups_chosen_indices_tuples = [
-            {group_id:-1 for group_id in indices_sets_by_group}
-                    for i in range(subgroups_size)
-        ]
-        self.groups_dataframe = groups_dataframe
-
-        self.id = str(id)
+    def __init__(self, feature_matrix, subgroups_size, objective = None, id = None):
+        if objective is None:
+            objective = objectives.PairwiseObjective()
+        num_groups = len(feature_matrix.group_ids)
+        group_sizes = feature_matrix.group_sizes
+        self.feature_matrix = feature_matrix
+        self.objective = objective
+        self.subgroups_size = subgroups_size
+        # Chosen row of each slot, -1 for open slots.
+        self.chosen_rows = np.full((subgroups_size, num_groups), -1, dtype=int)
+        # Rows discarded from each open slot, by (tuple index, group position),
+        # only for slots with discarded rows.
+        self.discarded_rows_by_slot = {}
+        self.num_discarded_rows = np.zeros((subgroups_size, num_groups), dtype=int)
+        # Feasibility counters: the number of open slots discarding each row,
+        # the number of rows discarded from every open slot (dead rows),
+        # and the number of open slots, by group.
+        self.discard_counts_by_group = [{} for _ in range(num_groups)]
+        self.num_dead_rows_by_group = np.zeros(num_groups, dtype=int)
+        self.num_open_slots_by_group = np.full(num_groups, subgroups_size, dtype=int)
+        self.num_possible_decisions = int(np.sum(group_sizes)) * subgroups_size
+        self.num_empty_open_slots = int(np.sum(group_sizes == 0)) * subgroups_size
+        self.num_deficient_groups = int(np.sum(group_sizes < subgroups_size))
+        self.group_statistics = objectives.GroupStatistics(
+            num_groups, feature_matrix.values.shape[1])
+        self.raw_group_statistics = objectives.GroupStatistics(
+            num_groups, feature_matrix.values.shape[1])
+
+        self.id = id
         self.internal_distance = -1
         self.solution = None
         self.indices_decision = (-1,-1,-1)
+        self.explored_decisions = []
 
-    def copy(self, copy_id=""):
+    def copy(self, copy_id = None):
         """
-        Creates a (deep) copy of a node
+        Creates a copy of a node, sharing nothing mutable with it.
         """
-        copy_node = PossibleSubgroupsNode(None,1, id = copy_id)
-        copy_node.subgroups_possible_indices_tuples = copy.deepcopy(self.subgroups_possible_indices_tuples)
-        copy_node.subgroups_chosen_indices_tuples = copy.deepcopy(self.subgroups_chosen_indices_tuples)
-        copy_node.groups_dataframe = self.groups_dataframe
+        copy_node = PossibleSubgroupsNode.__new__(PossibleSubgroupsNode)
+        copy_node.feature_matrix = self.feature_matrix
+        copy_node.objective = self.objective
+        copy_node.subgroups_size = self.subgroups_size
+        copy_node.chosen_rows = self.chosen_rows.copy()
+        copy_node.discarded_rows_by_slot = self.discarded_rows_by_slot.copy()
+        copy_node.num_discarded_rows = self.num_discarded_rows.copy()
+        copy_node.discard_counts_by_group = [
+            discard_counts.copy() for discard_counts in self.discard_counts_by_group
+        ]
+        copy_node.num_dead_rows_by_group = self.num_dead_rows_by_group.copy()
+        copy_node.num_open_slots_by_group = self.num_open_slots_by_group.copy()
+        copy_node.num_possible_decisions = self.num_possible_decisions
+        copy_node.num_empty_open_slots = self.num_empty_open_slots
+        copy_node.num_deficient_groups = self.num_deficient_groups
+        copy_node.group_statistics = self.group_statistics.copy()
+        copy_node.raw_group_statistics = self.raw_group_statistics.copy()
+        copy_node.id = copy_id
+        copy_node.internal_distance = -1
+        copy_node.solution = None
+        copy_node.indices_decision = (-1,-1,-1)
+        copy_node.explored_decisions = []
         return copy_node
 
     def __repr__(self):
         return f"Node {self.id}"
 
+    def get_memory_size(self, mother_node = None):
+        """
+        Returns the approximate number of bytes held by this node,
+        leaving out the sets of discarded rows it shares with its mother node.
+        """
+        shared_rows_by_slot = ({} if mother_node is None
+                               else mother_node.discarded_rows_by_slot)
+        objects = [self, self.chosen_rows, self.num_discarded_rows,
+                   self.num_dead_rows_by_group, self.num_open_slots_by_group,
+                   self.discarded_rows_by_slot, self.discard_counts_by_group,
+                   self.explored_decisions]
+        objects.extend(self.discard_counts_by_group)
+        for statistics in [self.group_statistics, self.raw_group_statistics]:
+            objects.extend([statistics, statistics.__dict__, statistics.counts,
+                            statistics.sums, statistics.squares])
+        return (sum(sys.getsizeof(owned_object) for owned_object in objects)
+                + sum(sys.getsizeof(discarded_rows)
+                      for slot, discarded_rows in self.discarded_rows_by_slot.items()
+                      if discarded_rows is not shared_rows_by_slot.get(slot))
+                + len(self.explored_decisions) * DECISION_MEMORY_SIZE)
+
     def __str__(self):
-        return (f"[Node {self.id} <- {self.subgroups_chosen_indices_tuples} <- {self.subgroups_possible_indices_tuples}; "
+        return (f"[Node {self.id} <- {self.chosen_rows.tolist()} <- {self.discarded_rows_by_slot}; "
                 f"Solution: {self.solution}; internal_distance = {self.internal_distance}]")
 
     ############# Iteration functions
@@ -212,26 +637,78 @@ class PossibleSubgroupsNode():
     def list_possible_decisions(self):
         """
         Returns a list of possible decisions,
-        as triples of tuple, subgroup, and element index.
+        as triples of tuple index, group position and row.
         Intended for use in for loops
         """
         possible_decisions_list = []
-        for tuple_index, group_id, possible_element_indices in self.list_choices_to_make():
-            for element_index in possible_element_indices:
-                possible_decisions_list.append((tuple_index, group_id, element_index))
+        for tuple_index, group_position in self.list_open_slots():
+            for row in self.get_candidate_rows(tuple_index, group_position):
+                possible_decisions_list.append((tuple_index, group_position, int(row)))
         return possible_decisions_list
 
-    def list_choices_to_make(self):
+    def list_open_slots(self):
         """
-        Returns a list of choices left,
-        as triples of tuple, subgroup, and a set of element indices to choose from.
+        Returns a list of the slots left to fill,
+        as pairs of tuple index and group position, by tuple then group.
         Intended for use in for loops.
         """
-        choices_left = []
-        for tuple_index, possible_subgroup_indices in enumerate(self.subgroups_possible_indices_tuples):
-            for group_id, possible_element_indices in possible_subgroup_indices.items():
-                choices_left.append((tuple_index,group_id, possible_element_indices))
-        return choices_left
+        return [(int(tuple_index), int(group_position))
+                for tuple_index, group_position in np.argwhere(self.chosen_rows < 0)]
+
+    def get_num_candidates(self, tuple_index, group_position):
+        """
+        Returns the number of candidates of a slot (0 if it is closed).
+        """
+        if self.chosen_rows[tuple_index, group_position] >= 0:
+            return 0
+        return (self.get_num_available_rows(group_position)
+                - self.num_discarded_rows[tuple_index, group_position])
+
+    def get_num_available_rows(self, group_position):
+        """
+        Returns the number of rows of a group that are not chosen yet.
+        """
+        return (self.feature_matrix.group_sizes[group_position] - self.subgroups_size
+                + self.num_open_slots_by_group[group_position])
+
+    def get_group_candidates_counts(self, group_position):
+        """
+        Returns the number of candidates of each open slot of a group.
+        """
+        open_slots = self.chosen_rows[:, group_position] < 0
+        return (self.get_num_available_rows(group_position)
+                - self.num_discarded_rows[open_slots, group_position])
+
+    def get_candidate_rows(self, tuple_index, group_position):
+        """
+        Returns the candidate rows of a slot, in the order of their group.
+        """
+        group_rows = self.feature_matrix.group_rows[group_position]
+        if self.chosen_rows[tuple_index, group_position] >= 0:
+            return group_rows[:0]
+        is_candidate = np.ones(len(group_rows), dtype=bool)
+        chosen_rows = self.chosen_rows[:, group_position]
+        is_candidate[self.feature_matrix.row_positions[chosen_rows[chosen_rows >= 0]]] = False
+        discarded_rows = self.discarded_rows_by_slot.get((tuple_index, group_position))
+        if discarded_rows:
+            is_candidate[self.feature_matrix.row_positions[list(discarded_rows)]] = False
+        return group_rows[is_candidate]
+
+    def get_tuple_rows(self, tuple_index):
+        """
+        Returns the rows already chosen in a tuple.
+        """
+        tuple_rows = self.chosen_rows[tuple_index]
+        return tuple_rows[tuple_rows >= 0]
+
+    def is_candidate(self, tuple_index, group_position, row):
+        """
+        Returns if a row of a group is a candidate of one of its slots.
+        """
+        return (self.chosen_rows[tuple_index, group_position] < 0
+                and not np.any(self.chosen_rows[:, group_position] == row)
+                and row not in self.discarded_rows_by_slot.get(
+                    (tuple_index, group_position), ()))
 
     ############# Properties
 
@@ -240,21 +717,33 @@ class PossibleSubgroupsNode():
         Returns if this node is a leaf.
         In other words, it checks if all the indices were chosen in this node.
         """
-        return np.all(
-            np.asarray([list(tuple.values())
-                for tuple in self.subgroups_chosen_indices_tuples])
-            != -1)
+        return not np.any(self.num_open_slots_by_group)
     def is_end_of_branch(self):
         """
         Returns if this node is at the end of its branch.
         In other words, it checks if there is no choice left to be made.
         """
-        return self.list_possible_decisions() == []
+        return self.num_possible_decisions == 0
+    def is_feasible(self):
+        """
+        Returns if this node can still lead to a leaf, as far as
+        constant-time checks can tell: no open slot is left without candidates,
+        and every group has at least as many candidates left as open slots.
+        """
+        return self.num_empty_open_slots == 0 and self.num_deficient_groups == 0
+    def is_group_deficient(self, group_position):
+        """
+        Returns if a group has fewer candidates left than open slots.
+        """
+        num_open_slots = self.num_open_slots_by_group[group_position]
+        return bool(num_open_slots > 0 and
+                    self.get_num_available_rows(group_position)
+                    - self.num_dead_rows_by_group[group_position] < num_open_slots)
     def is_root(self):
         """
         Checks if a node is the root of the tree.
         """
-        return self.id is ROOT_ID
+        return self.id == ROOT_ID
 
     def has_better_distance_than(self, target_node):
         """
@@ -268,82 +757,117 @@ class PossibleSubgroupsNode():
         return self.internal_distance < target_node.internal_distance
 
     ############# Decision functions
+    # Decisions are triples of tuple index, group position and row,
+    # and are not checked: see validate_decision for external ones.
 
-    def discard_possible_index(self, element_index, group_id):
-        """
-        Removes the choice of an index in all the tuples of this node.
-        """
-        for tuple_index, _ in enumerate(self.subgroups_possible_indices_tuples):
-            self.discard_decision((tuple_index, group_id, element_index))
-
-    #factoriser les deux?
     def discard_decision(self, decision):
         """
         Removes a possible decision from this node.
-        (that is, an index choice linked to a given tuple and group).
-        """
-        tuple_index, group_id, element_index = self.validate_decision(
-            decision,
-            check_element_index = False
-        )
-        self.subgroups_possible_indices_tuples[tuple_index][group_id].discard(
-            element_index
+        (that is, a row choice linked to a given tuple and group).
+        """
+        tuple_index, group_position, row = decision
+        slot = (tuple_index, group_position)
+        discarded_rows = self.discarded_rows_by_slot.get(slot, frozenset())
+        if (self.chosen_rows[tuple_index, group_position] >= 0
+                or row in discarded_rows
+                or np.any(self.chosen_rows[:, group_position] == row)):
+            return
+        was_deficient = self.is_group_deficient(group_position)
+        self.discarded_rows_by_slot[slot] = discarded_rows | {row}
+        self.num_discarded_rows[tuple_index, group_position] += 1
+        self.num_possible_decisions -= 1
+        if self.get_num_candidates(tuple_index, group_position) == 0:
+            self.num_empty_open_slots += 1
+        discard_counts = self.discard_counts_by_group[group_position]
+        discard_counts[row] = discard_counts.get(row, 0) + 1
+        if discard_counts[row] == self.num_open_slots_by_group[group_position]:
+            self.num_dead_rows_by_group[group_position] += 1
+        self.num_deficient_groups += self.is_group_deficient(group_position) - was_deficient
+
+    def close_slot(self, tuple_index, group_position, row):
+        """
+        Fills an open slot with a row, which stops being a candidate
+        of the other slots of its group.
+        """
+        was_deficient = self.is_group_deficient(group_position)
+        candidates_counts = self.get_group_candidates_counts(group_position)
+        self.num_possible_decisions -= int(np.sum(candidates_counts))
+        self.num_empty_open_slots -= int(np.sum(candidates_counts == 0))
+
+        discard_counts = self.discard_counts_by_group[group_position]
+        for discarded_row in self.discarded_rows_by_slot.pop((tuple_index, group_position), ()):
+            discard_counts[discarded_row] -= 1
+            if discard_counts[discarded_row] == 0:
+                del discard_counts[discarded_row]
+        self.num_discarded_rows[tuple_index, group_position] = 0
+        if row in discard_counts:
+            del discard_counts[row]
+            for slot, discarded_rows in list(self.discarded_rows_by_slot.items()):
+                if slot[1] == group_position and row in discarded_rows:
+                    self.discarded_rows_by_slot[slot] = discarded_rows - {row}
+                    self.num_discarded_rows[slot] -= 1
+
+        self.chosen_rows[tuple_index, group_position] = row
+        self.num_open_slots_by_group[group_position] -= 1
+        num_open_slots = self.num_open_slots_by_group[group_position]
+        self.num_dead_rows_by_group[group_position] = (
+            0 if num_open_slots == 0
+            else sum(1 for count in discard_counts.values() if count == num_open_slots)
         )
 
-    def create_new_node_from_decision(
-            self,
-            decision,
-            groups_dataframe,
-            new_node_id =""
-        ):
+        candidates_counts = self.get_group_candidates_counts(group_position)
+        self.num_possible_decisions += int(np.sum(candidates_counts))
+        self.num_empty_open_slots += int(np.sum(candidates_counts == 0))
+        self.num_deficient_groups += self.is_group_deficient(group_position) - was_deficient
+
+    def create_new_node_from_decision(self, decision, new_node_id = None):
         """
         Creates and return a new node based on a decision
-        (a tuple index, a group id and an element_index) in this node.
+        (a tuple index, a group position and a row) in this node.
         """
-        tuple_index, group_id, element_index = self.validate_decision(decision)
-
+        tuple_index, group_position, row = decision
         new_node = self.copy(copy_id=new_node_id)
-        new_node.subgroups_possible_indices_tuples[tuple_index][group_id] = set()
-        new_node.subgroups_chosen_indices_tuples[tuple_index][group_id] = element_index
-        new_node.indices_decision = (tuple_index, group_id, element_index)
-        new_node.internal_distance = -1
-        new_node.solution = None
-        new_node.discard_possible_index(element_index, group_id)
+        new_node.fill_slot(decision)
+        new_node.indices_decision = (tuple_index, group_position, row)
+        return new_node
 
-        if new_node.is_leaf():
-            new_node.internal_distance = metrics.compute_distance_between_subgroups(
-                new_node.subgroups_chosen_indices_tuples,
-                groups_dataframe
+    def fill_slot(self, decision):
+        """
+        Applies a decision (a tuple index, a group position and a row)
+        to this very node, and computes its distance if it becomes a leaf.
+        """
+        tuple_index, group_position, row = decision
+        self.close_slot(tuple_index, group_position, row)
+        self.group_statistics.add(group_position, self.feature_matrix.values[row])
+        self.raw_group_statistics.add(group_position, self.feature_matrix.raw_values[row])
+
+        if self.is_leaf():
+            self.internal_distance = self.objective.compute_distance(
+                self.group_statistics
             )
-            new_node.solution = new_node.subgroups_chosen_indices_tuples
-        return new_node
+            self.solution = self.chosen_rows
 
     #################################### Type & Values checking ################
-    #Should do with tuple, but as we have self... wait for tuple class
+    # Used for decisions given from outside of the search only.
     def validate_group_id(self,group_id):
         """
-        Ensures the group id is valid in the given node.
-        If it is already a valid id, it is directly returned.
+        Ensures the group id is valid in the given node,
+        and returns its position.
         If it is an integer (i.e. an index), it is used as such.
         All other cases raise an Error.
         """
-        if isinstance(group_id, int):
-            group_index = group_id
-            group_ids = list(
-                self.subgroups_possible_indices_tuples[0].keys()
-            )
-
+        group_ids = self.feature_matrix.group_ids
+        if isinstance(group_id, (int, np.integer)):
             group_indices = range(len(group_ids))
-            if group_index not in group_indices:
-                raise ValueError(f"Tried to interpret {group_index} as a group index, but valid indices are {groups_indices}!")
-
-            return group_ids[group_index]
+            if group_id not in group_indices:
+                raise ValueError(f"Tried to interpret {group_id} as a group index, but valid indices are {group_indices}!")
+            return int(group_id)
 
         if not isinstance(group_id, str):
             raise TypeError(f"Groups id should be of type int or str, not {type(group_id)}!")
 
-        if group_id in self.subgroups_possible_indices_tuples[0]:
-            return group_id
+        if group_id in self.feature_matrix.group_positions:
+            return self.feature_matrix.group_positions[group_id]
 
         raise ValueError(f"Wrong group id:{group_id}!")
 
@@ -351,24 +875,28 @@ class PossibleSubgroupsNode():
         """
         Ensures a tuple index is valid in the given node.
         """
-        valid_tuple_indices = range(len(self.subgroups_possible_indices_tuples))
+        valid_tuple_indices = range(self.subgroups_size)
         if tuple_index in valid_tuple_indices:
             return tuple_index
         raise ValueError(f"Invalid tuple index: {tuple_index}! Should be in {valid_tuple_indices}")
 
-    def validate_decision(self, decision, check_element_index = True):
+    def validate_decision(self, decision):
         """
-        Ensures the decision is valid in the given node.
-        Fixes the group id if necessary.
+        Ensures a decision, given as a tuple index, a group id (or index)
+        and an element index, is valid in the given node.
+        Returns it as a tuple index, a group position and a row.
         """
         if len(decision) != 3:
             raise TypeError("Decision should only have three elements!")
         tuple_index, group_id, element_index = decision
         tuple_index = self.validate_tuple_index(tuple_index)
-        group_id = self.validate_group_id(group_id)
+        group_position = self.validate_group_id(group_id)
 
-        valid_element_indices = self.subgroups_possible_indices_tuples[tuple_index][group_id]
-        if check_element_index and element_index not in valid_element_indices:
+        group_id = self.feature_matrix.group_ids[group_position]
+        row = self.feature_matrix.rows_by_group[group_id].get(element_index)
+        if row is None or not self.is_candidate(tuple_index, group_position, row):
+            valid_element_indices = self.feature_matrix.get_elements(
+                self.get_candidate_rows(tuple_index, group_position))
             raise ValueError(f"Wrong element index! Is {element_index} and should be in {valid_element_indices}!")
 
-        return tuple_index, group_id, element_index
+        return tuple_index, group_position, row
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created: 19.10.2026
+
+This file is dedicated to the matching server.
+The server keeps loaded datasets and their compiled feature matrices
+in memory, and runs matching requests concurrently in a pool of workers,
+so that repeated requests only pay for the search itself.
+
+Requests and responses are JSON objects, one per line,
+exchanged over a Unix socket or a localhost TCP port.
+A matching request looks like:
+    {"id": "r1", "action": "match", "datafile": "ToySets/toy_data.csv",
+     "match": "Value", "group": "Control", "subset_size": 2,
+     "time_limit": 10}
+and may also hold "delimiter", "binary_cache", "local_heuristic_name",
+"slot_ordering_name", "num_threads",
+"global_heuristic_name", "metric_name", "weights", "objective_name",
+"stopping_criterion_name", "stopping_threshold", "max_iterations",
+"num_solutions", "min_difference", "solver_name", "seed",
+"temperature_schedule_name", "num_strata" and "max_memory",
+with the same meaning as in match.py.
+Matching requests need an id, distinct from those of running requests.
+A running request is cancelled with {"action": "cancel", "target": "r1"}.
+Responses hold the request id, a status ("ok", "cancelled" or "error")
+and the selected indices of each subgroup of each solution found,
+from the best to the worst
+(cancelled searches return the best solutions found so far).
+"""
+import os
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import binary_cache
+import local_heuristics
+import global_heuristics
+from preprocessing import compile_feature_matrix
+from match import prepare_grouped_dataframe, find_matched_subgroups
+
+
+class DatasetCache():
+    """
+    Loaded grouped dataframes and compiled feature matrices,
+    by source file (and its modification time) and matching parameters.
+    A dataset requested concurrently is only built once.
+    """
+
+    def __init__(self):
+        self.datasets = {}
+        self.lock = threading.Lock()
+        self.build_locks_by_key = {}
+
+    def get(self, datafile, delimiter, variables_to_match, grouping_factors,
+            metric_name, weights, use_binary_cache = False):
+        """
+        Returns the grouped dataframe and feature matrix for given parameters,
+        loading (possibly from a binary cache) and compiling them if needed.
+        Datasets whose source file changed are reloaded.
+        """
+        file_status = os.stat(datafile)
+        key = (os.path.abspath(datafile), file_status.st_mtime_ns,
+               file_status.st_size, delimiter, tuple(variables_to_match),
+               tuple(grouping_factors), metric_name,
+               None if weights is None else tuple(weights))
+        with self.lock:
+            if key in self.datasets:
+                return self.datasets[key]
+            build_lock = self.build_locks_by_key.setdefault(key, threading.Lock())
+
+        with build_lock:
+            with self.lock:
+                if key in self.datasets:
+                    return self.datasets[key]
+            if use_binary_cache:
+                df = binary_cache.load_dataframe(datafile, delimiter,
+                    column_names = variables_to_match + grouping_factors)
+            else:
+                df = pd.read_csv(datafile, sep=delimiter)
+            grouped_dataframe = prepare_grouped_dataframe(df,
+                                                          variables_to_match,
+                                                          grouping_factors)
+            feature_matrix = compile_feature_matrix(grouped_dataframe,
+                                                    variables_to_match,
+                                                    metric_name=metric_name,
+                                                    weights=weights)
+            with self.lock:
+                stale_keys = [cached_key for cached_key in self.datasets
+                              if cached_key[0] == key[0] and cached_key[1:3] != key[1:3]]
+                for stale_key in stale_keys:
+                    del self.datasets[stale_key]
+                self.datasets[key] = (grouped_dataframe, feature_matrix)
+                self.build_locks_by_key.pop(key, None)
+        return grouped_dataframe, feature_matrix
+
+
+def split_names(names):
+    """
+    Returns a list of names, from either a list or a ';'-separated string.
+    """
+    if isinstance(names, str):
+        return names.split(";")
+    return list(names)
+
+def run_match_request(request, dataset_cache, stop_event):
+    """
+    Runs a matching request, and returns its response.
+    --
+    Input:
+        - request: dict. The matching request.
+        - dataset_cache: DatasetCache. The cache of loaded datasets.
+        - stop_event: threading.Event. An event to cancel the search.
+    Output:
+        - response: dict. The response to the request.
+    """
+    start_time = time.monotonic()
+    variables_to_match = split_names(request["match"])
+    grouping_factors = split_names(request["group"])
+    weights = request.get("weights")
+    if isinstance(weights, str):
+        weights = [float(weight) for weight in weights.split(";")]
+    metric_name = request.get("metric_name", "euclidian")
+
+    grouped_dataframe, feature_matrix = dataset_cache.get(
+        request["datafile"], request.get("delimiter", ";"),
+        variables_to_match, grouping_factors, metric_name, weights,
+        request.get("binary_cache", False))
+
+    local_heuristic = local_heuristics.get_local_heuristic_by_name(
+        request.get("local_heuristic_name", "first_possible"),
+        request.get("slot_ordering_name"),
+        request.get("num_threads", 1))
+    global_heuristic = global_heuristics.get_global_heuristic_by_name(
+        request.get("global_heuristic_name", "full_tree"), local_heuristic)
+
+    solution_dataframes = find_matched_subgroups(
+        grouped_dataframe,
+        variables_to_match,
+        local_heuristic,
+        global_heuristic,
+        request["subset_size"],
+        metric_name=metric_name,
+        weights=weights,
+        objective_name=request.get("objective_name", "pairwise"),
+        stopping_criterion_name=request.get("stopping_criterion_name"),
+        stopping_threshold=request.get("stopping_threshold"),
+        feature_matrix=feature_matrix,
+        max_iterations=request.get("max_iterations", 10000),
+        time_limit=request.get("time_limit"),
+        stop_event=stop_event,
+        num_solutions=request.get("num_solutions"),
+        min_difference=request.get("min_difference", 1),
+        solver_name=request.get("solver_name", "tree_search"),
+        seed=request.get("seed"),
+        temperature_schedule_name=request.get("temperature_schedule_name",
+                                              "geometric"),
+        num_strata=request.get("num_strata"),
+        max_memory=(None if request.get("max_memory") is None
+                    else int(request["max_memory"] * 2**20)))
+    if request.get("num_solutions") is None:
+        solution_dataframes = [solution_dataframes]
+
+    solutions = [{str(group_id): subgroup_dataframe.index.tolist()
+                  for group_id, subgroup_dataframe in solution_dataframe}
+                 for solution_dataframe in solution_dataframes]
+    return {"status": "cancelled" if stop_event.is_set() else "ok",
+            "solutions": solutions,
+            "elapsed": time.monotonic() - start_time}
+
+
+class MatchingServer():
+    """
+    Server answering matching requests over a Unix socket or a localhost port.
+    """
+
+    def __init__(self, num_workers = None):
+        self.dataset_cache = DatasetCache()
+        self.executor = ThreadPoolExecutor(max_workers = num_workers)
+        self.stop_events_by_request = {}
+
+    async def handle_request(self, request, writer, write_lock):
+        """
+        Runs a request in the worker pool and writes its response.
+        """
+        request_id = request.get("id")
+        action = request.get("action", "match")
+        if action == "ping":
+            response = {"status": "ok"}
+        elif action == "cancel":
+            stop_event = self.stop_events_by_request.get(request.get("target"))
+            if stop_event is not None:
+                stop_event.set()
+            response = {"status": "ok" if stop_event is not None else "error",
+                        "cancelled": stop_event is not None}
+        elif action == "match" and request_id is None:
+            response = {"status": "error", "error": "Matching requests need an id!"}
+        elif action == "match" and request_id in self.stop_events_by_request:
+            response = {"status": "error",
+                        "error": f"Request id {request_id} is already running!"}
+        elif action == "match":
+            stop_event = threading.Event()
+            self.stop_events_by_request[request_id] = stop_event
+            try:
+                response = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, run_match_request,
+                    request, self.dataset_cache, stop_event)
+            except Exception as error:
+                response = {"status": "cancelled" if stop_event.is_set() else "error",
+                            "error": repr(error)}
+            finally:
+                self.stop_events_by_request.pop(request_id, None)
+        else:
+            response = {"status": "error", "error": f"Unknown action: {action}!"}
+
+        response["id"] = request_id
+        async with write_lock:
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        """
+        Reads requests from a connection, each being handled concurrently.
+        """
+        write_lock = asyncio.Lock()
+        tasks = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as error:
+                request = {"action": f"invalid JSON ({error})"}
+            tasks.append(asyncio.create_task(
+                self.handle_request(request, writer, write_lock)))
+        await asyncio.gather(*tasks, return_exceptions=True)
+        writer.close()
+
+    async def serve(self, socket_path = None, port = None):
+        """
+        Serves requests until interrupted,
+        over a Unix socket if a path is given, and a localhost port otherwise.
+        """
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection,
+                                                     path=socket_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection,
+                                                host="127.0.0.1", port=port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for stop_event in self.stop_events_by_request.values():
+                stop_event.set()
+            self.executor.shutdown(wait=False)
+            if socket_path is not None and os.path.exists(socket_path):
+                os.remove(socket_path)
+
+
+def send_requests(requests, socket_path = None, port = None):
+    """
+    Sends requests to a running server and waits for all their responses.
+    --
+    Input:
+        - requests: dict list. The requests to send.
+    Parameters:
+        - socket_path: string. The Unix socket of the server.
+            Defaults to None (use port).
+        - port: int. The localhost port of the server. Defaults to None.
+    Output:
+        - responses: dict list. The responses, in order of arrival.
+    """
+    if socket_path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(socket_path)
+    else:
+        connection = socket.create_connection(("127.0.0.1", port))
+    with connection, connection.makefile("rw") as stream:
+        for request in requests:
+            stream.write(json.dumps(request) + "\n")
+        stream.flush()
+        connection.shutdown(socket.SHUT_WR)
+        return [json.loads(line) for line in stream]
+
+
+if __name__ == "__main__":
+    """
+    Upon being executed, serves matching requests until interrupted.
+
+    ---
+    Call example:
+        - python3 server.py --socket /tmp/equitables.sock
+        - python3 server.py --port 8765 --workers 4
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket",
+                        type=str,
+                        default=None,
+                        help="The Unix socket to listen on. ")
+    parser.add_argument("--port",
+                        type=int,
+                        default=8765,
+                        help="The localhost port to listen on, " +
+                        "if no socket is given. Defaults to 8765. ")
+    parser.add_argument("--workers",
+                        type=int,
+                        default=None,
+                        help="The number of concurrent searches. " +
+                        "Defaults to the ThreadPoolExecutor default. ")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(MatchingServer(args.workers).serve(args.socket, args.port))
+    except KeyboardInterrupt:
+        pass
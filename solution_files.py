@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created: 19.10.2026
+
+This file is dedicated to solution files.
+A solution file is a small JSON file holding the best solutions of a search,
+as the indices of the elements selected in each group, with their distances
+and the parameters they were computed with.
+It can be read back to re-match an edited dataset from a previous solution
+(see EquiTables.match).
+Element indices are those of the dataframe: they only identify the same
+elements across edits if the dataframe is indexed by an id column.
+"""
+import json
+import numpy as np
+
+SOLUTION_FILE_VERSION = 1
+
+
+def to_json_value(value):
+    """
+    Converts a numpy scalar to the matching Python value.
+    """
+    return value.item() if isinstance(value, np.generic) else value
+
+def get_solution_records(search_tree):
+    """
+    Returns the best solutions of a search tree,
+    as the element indices of each group, with their distances.
+    --
+    Input:
+        - search_tree: SearchTree. The search tree.
+    Output:
+        - solution_records: dict list. The solutions, from the best to the worst,
+            with their "distance" and the element indices of their "subgroups",
+            by group id.
+    """
+    return [{"distance": float(distance),
+             "subgroups": {str(group_id): [to_json_value(element_index)
+                                           for element_index in element_indices]
+                           for group_id, element_indices
+                           in search_tree.get_solution_elements(solution).items()}}
+            for distance, solution in search_tree.get_best_solutions()]
+
+def save_solution_file(search_tree, solution_path, objective_name = None):
+    """
+    Writes the best solutions of a search tree to a solution file.
+    --
+    Input:
+        - search_tree: SearchTree. The search tree.
+        - solution_path: string. The path of the solution file.
+    Parameters:
+        - objective_name: string. The name of the objective
+            the distances were computed with. Defaults to None.
+    """
+    feature_matrix = search_tree.root.feature_matrix
+    solution_file_content = {"version": SOLUTION_FILE_VERSION,
+                             "objective_name": objective_name,
+                             "metric_name": feature_matrix.metric_name,
+                             "column_names": feature_matrix.column_names,
+                             "weights": feature_matrix.weights.tolist(),
+                             "subgroups_size": search_tree.root.subgroups_size,
+                             "solutions": get_solution_records(search_tree)}
+    with open(solution_path, "w") as solution_file:
+        json.dump(solution_file_content, solution_file, indent=1)
+
+def load_solution_file(solution_path):
+    """
+    Reads a solution file.
+    --
+    Input:
+        - solution_path: string. The path of the solution file.
+    Output:
+        - solution_file_content: dict. The content of the solution file.
+    """
+    with open(solution_path) as solution_file:
+        solution_file_content = json.load(solution_file)
+    if solution_file_content.get("version") != SOLUTION_FILE_VERSION:
+        raise ValueError(f"Unsupported solution file version: "
+                         f"{solution_file_content.get('version')}!")
+    if not solution_file_content["solutions"]:
+        raise ValueError(f"No solution in {solution_path}!")
+    return solution_file_content
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created: 19.10.2026
+
+Tests of the memory budget of tree searches (see SearchTree.search).
+Run with: python -m pytest -q
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import match
+import local_heuristics
+import global_heuristics
+from feature_matrix import build_feature_matrix
+from search_tree import SearchTree
+
+# Largest relative gap between the estimated and traced memory growth.
+MEMORY_TOLERANCE = 0.15
+
+
+def build_search_tree(group_size = 60, subgroups_size = 6, seed = 0):
+    random_generator = np.random.default_rng(seed)
+    feature_matrix = build_feature_matrix(
+        random_generator.normal(size=(3 * group_size, 2)),
+        np.repeat([0, 1, 2], group_size))
+    return SearchTree(feature_matrix, subgroups_size)
+
+def run_search(search_tree, **search_parameters):
+    search_tree.search(local_heuristics.choose_nearest,
+                       global_heuristics.search_full_tree,
+                       **search_parameters)
+    return search_tree
+
+
+@pytest.mark.parametrize("max_memory", [None, 2 * 10**6])
+def test_memory_estimate_matches_tracemalloc(max_memory):
+    search_tree = run_search(build_search_tree(), max_iterations=3000,
+                             max_memory=max_memory, measure_memory=True)
+    estimated = search_tree.memory_measurement["estimated"]
+    traced = search_tree.memory_measurement["traced"]
+    assert traced > 0
+    assert abs(estimated - traced) <= MEMORY_TOLERANCE * traced
+
+def test_over_budget_search_evicts_nodes_and_finds_solutions():
+    unbounded_tree = run_search(build_search_tree(), max_iterations=3000,
+                                measure_memory=True)
+    max_memory = unbounded_tree.memory_size // 10
+    bounded_tree = run_search(build_search_tree(), max_iterations=3000,
+                              max_memory=max_memory)
+
+    assert not bounded_tree.exceeded_memory_budget
+    assert bounded_tree.num_iterations == unbounded_tree.num_iterations
+    assert len(bounded_tree.mothers_by_nodes) < len(unbounded_tree.mothers_by_nodes)
+    assert bounded_tree.memory_size <= max_memory
+    assert (bounded_tree.get_best_solutions()[0][0]
+            == unbounded_tree.get_best_solutions()[0][0])
+
+def test_tiny_budget_raises_a_clear_error():
+    random_generator = np.random.default_rng(0)
+    dataframe = pd.DataFrame({"Group": np.repeat(["a", "b"], 20),
+                              "Value": random_generator.normal(size=40)})
+    grouped_dataframe = match.prepare_grouped_dataframe(dataframe, ["Value"], ["Group"])
+    with pytest.raises(ValueError, match="memory budget"):
+        match.find_matched_subgroups(grouped_dataframe, ["Value"],
+                                     local_heuristics.choose_nearest,
+                                     global_heuristics.search_full_tree,
+                                     subgroup_size=5,
+                                     max_memory=1000)